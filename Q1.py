@@ -13,6 +13,7 @@
     "import pandas as pd\n",
     "import plotly.express as px\n",
     "from statsmodels.tsa.holtwinters import ExponentialSmoothing\n",
+    "import util\n",
     "\n",
     "# --- Page Config ---\n",
     "st.set_page_config(page_title=\"Maintenance Cost Dashboard\", layout=\"wide\")\n",
@@ -30,21 +31,12 @@
     "\n",
     "@st.cache_data(ttl=3600)\n",
     "def load_real_data(files):\n",
-    "    dfs = []\n",
-    "    for f in files:\n",
-    "        df = pd.read_excel(f, sheet_name=\"Sheet1\", engine=\"openpyxl\")\n",
-    "        dfs.append(df)\n",
-    "    df_all = pd.concat(dfs, ignore_index=True)\n",
-    "    df_all[\"Posting Date\"] = pd.to_datetime(df_all[\"Posting Date\"])\n",
-    "    df_all[\"Year\"]  = df_all[\"Posting Date\"].dt.year\n",
-    "    df_all[\"Month\"] = df_all[\"Posting Date\"].dt.month\n",
-    "    df_all[\"Cost\"]  = df_all[\"In profit center local currency\"].fillna(0)\n",
-    "    return df_all\n",
+    "    # Lecture mise en cache sur disque (Parquet) par util.load_real_data\n",
+    "    return util.load_real_data(files)\n",
     "\n",
     "df = load_real_data(uploaded_data)\n",
     "\n",
     "# --- Calcul automatique Budget & Forecast ---\n",
-    "@st.cache_data(ttl=3600)\n",
     "def compute_budget_forecast(df):\n",
     "    ts = (\n",
     "        df\n",
@@ -82,7 +74,12 @@
     "        dfx[\"Month\"] = dfx[\"Period\"].dt.month\n",
     "    return dfB, dfF\n",
     "\n",
-    "dfB, dfF = compute_budget_forecast(df)\n",
+    "@st.cache_data(ttl=3600)\n",
+    "def load_budget_forecast(_df, fingerprint):\n",
+    "    # Clé de cache = empreinte du jeu de données, pas un hachage du DataFrame entier\n",
+    "    return compute_budget_forecast(_df)\n",
+    "\n",
+    "dfB, dfF = load_budget_forecast(df, util.dataset_fingerprint(df))\n",
     "\n",
     "# --- Filtres ---\n",
     "st.sidebar.title(\"Filtres\")\n",
@@ -134,7 +131,7 @@
     "\n",
     "with tabs[1]:\n",
     "    st.header(\"Total Cost & Benchmark\")\n",
-    "    agg = df_filt.groupby(\"Plant\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Plant\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Plant\", y=\"Cost\", labels={\"Cost\":\"Coût total\"}), use_container_width=True)\n",
     "\n",
     "with tabs[2]:\n",
@@ -152,22 +149,22 @@
     "\n",
     "with tabs[3]:\n",
     "    st.header(\"Cost at Functional Location\")\n",
-    "    agg = df_filt.groupby(\"Functional Area\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Functional Area\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Functional Area\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "with tabs[4]:\n",
     "    st.header(\"Cost at Equipment\")\n",
-    "    agg = df_filt.groupby(\"Equipment\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Equipment\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Equipment\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "with tabs[5]:\n",
     "    st.header(\"Cost at Vendor\")\n",
-    "    agg = df_filt.groupby(\"Vendor\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Vendor\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Vendor\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "with tabs[6]:\n",
     "    st.header(\"Cost at Material\")\n",
-    "    agg = df_filt.groupby(\"Material\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Material\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Material\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "with tabs[7]:\n",
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from util import load_real_data, compute_budget_forecast
+import plotly.graph_objects as go
+from util import load_real_data, dataset_fingerprint, field_domains
+from forecast import budget_forecast_by, forecast_bands_by, empty_budget_forecast, submit_background, background_result
 
 # --- Page Config ---
 st.set_page_config(page_title="Maintenance Cost Dashboard", layout="wide")
@@ -18,13 +20,39 @@ if not uploaded_data:
     st.stop()
 
 df = load_real_data(uploaded_data)
-dfB, dfF = compute_budget_forecast(df)
+
+# --- Budget & Forecast calculés en arrière-plan (clé = empreinte du jeu de données) ---
+# Une paire (dfB, dfF) par usine + "Toutes" : changer d'usine = simple lecture.
+forecast_job = submit_background(("budget_forecast", dataset_fingerprint(df)), budget_forecast_by, df, "Plant", "Toutes")
+budget_forecast = None
+if forecast_job.done():
+    try:
+        budget_forecast = background_result(forecast_job)
+    except Exception as e:
+        st.warning(f"Budget & Forecast indisponibles : {e}")
+        budget_forecast = {}
+
+# Prévision jusqu'à 18 mois avec intervalle à 90 % (trajectoires simulées), aussi en arrière-plan
+bands_job = submit_background(("forecast_bands", dataset_fingerprint(df)), forecast_bands_by, df, "Plant", "Toutes", 18)
+forecast_bands = None
+if bands_job.done():
+    try:
+        forecast_bands = background_result(bands_job)
+    except Exception as e:
+        st.warning(f"Intervalles de prévision indisponibles : {e}")
+        forecast_bands = {}
+
+@st.cache_data(ttl=3600)
+def load_field_domains(_df, fingerprint):
+    return field_domains(_df)
+
+domains = load_field_domains(df, dataset_fingerprint(df))
 
 # --- Filtres ---
 st.sidebar.title("Filtres")
-years = sorted(df["Year"].unique())
+years = domains["Year"]
 year = st.sidebar.selectbox("Année", years, index=len(years) - 1)
-plants = ["Toutes"] + sorted(df["Plant"].dropna().unique().tolist())
+plants = ["Toutes"] + domains["Plant"]
 plant = st.sidebar.selectbox("Usine", plants)
 
 mask = (df["Year"] == year)
@@ -50,6 +78,10 @@ with tabs[0]:
         .rename(columns={"Posting Date": "Period", "Cost": "Actual"})
     )
     real["Period"] = pd.to_datetime(real["Period"], errors="coerce")
+    if budget_forecast is None:
+        st.info("⏳ Budget et Forecast en cours de calcul, le graphique sera complété automatiquement.")
+    # Copies : les résultats en arrière-plan sont partagés entre sessions
+    dfB, dfF = (frame.copy() for frame in (budget_forecast or {}).get(plant) or empty_budget_forecast())
     dfB["Period"] = pd.to_datetime(dfB["Period"], errors="coerce")
     dfF["Period"] = pd.to_datetime(dfF["Period"], errors="coerce")
     comp = pd.merge(real, dfB, on="Period", how="left")
@@ -63,6 +95,22 @@ with tabs[0]:
             labels={"value": "Coût", "Period": "Mois"},
             markers=True
         )
+        bands = (forecast_bands or {}).get(plant)
+        if bands is not None:
+            horizon = st.slider("Horizon de prévision (mois)", 1, len(bands), min(12, len(bands)))
+            bands = bands.head(horizon)
+            fig.add_trace(go.Scatter(
+                x=bands["Period"], y=bands["Upper"], mode="lines",
+                line=dict(width=0), showlegend=False, hoverinfo="skip"
+            ))
+            fig.add_trace(go.Scatter(
+                x=bands["Period"], y=bands["Lower"], mode="lines", line=dict(width=0),
+                fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name="Intervalle 90 %"
+            ))
+            fig.add_trace(go.Scatter(
+                x=bands["Period"], y=bands["Forecast"], mode="lines+markers",
+                line=dict(dash="dash"), name="Forecast multi-mois"
+            ))
         st.plotly_chart(fig, use_container_width=True)
     except Exception as e:
         st.warning(f"Erreur dans l'affichage du graphique : {e}")
@@ -70,7 +118,7 @@ with tabs[0]:
 
 with tabs[1]:
     st.header("Total Cost & Benchmark")
-    agg = df_filt.groupby("Plant")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Plant", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Plant", y="Cost", labels={"Cost": "Coût total"}), use_container_width=True)
 
 with tabs[2]:
@@ -88,25 +136,25 @@ with tabs[2]:
 
 with tabs[3]:
     st.header("Cost at Functional Location")
-    agg = df_filt.groupby("Functional Area")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Functional Area", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Functional Area", y="Cost"), use_container_width=True)
 
 with tabs[4]:
     st.header("Cost at Equipment")
     if "Equipment" in df_filt.columns:
-        agg = df_filt.groupby("Equipment")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+        agg = df_filt.groupby("Equipment", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
         st.plotly_chart(px.bar(agg, x="Equipment", y="Cost"), use_container_width=True)
     else:
         st.warning("La colonne 'Equipment' est absente des fichiers chargés.")
 
 with tabs[5]:
     st.header("Cost at Vendor")
-    agg = df_filt.groupby("Vendor")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Vendor", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Vendor", y="Cost"), use_container_width=True)
 
 with tabs[6]:
     st.header("Cost at Material")
-    agg = df_filt.groupby("Material")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Material", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Material", y="Cost"), use_container_width=True)
 
 with tabs[7]:
@@ -127,3 +175,16 @@ with tabs[8]:
         st.plotly_chart(px.bar(agg, x="Stop ID", y="Cost", hover_data=["Stop Cause"]), use_container_width=True)
     else:
         st.warning("Colonnes 'Stop ID' et 'Stop Cause' absentes des données.")
+
+# --- Calculs encore en cours : la page reste utilisable pendant l'ajustement ;
+# un fragment vérifie les calculs toutes les 2 s et relance la page quand ils sont prêts ---
+@st.fragment(run_every=2)
+def background_status(jobs):
+    if all(job.done() for job in jobs):
+        st.rerun()
+    st.caption("⏳ Calculs en arrière-plan en cours…")
+
+jobs = ((forecast_job, budget_forecast), (bands_job, forecast_bands))
+pending = [job for job, result in jobs if result is None]
+if pending:
+    background_status(pending)
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import load_real_data, compute_budget_forecast
+from utils import load_real_data, compute_budget_forecast, dataset_fingerprint, field_domains
+from forecast import submit_background, background_result, empty_budget_forecast
 
 # --- Page Config ---
 st.set_page_config(page_title="Maintenance Cost Dashboard", layout="wide")
@@ -21,34 +22,49 @@ if not uploaded_data:
     st.stop()
 
 df = load_real_data(uploaded_data)
-dfB, dfF = compute_budget_forecast(df)
+
+# --- Budget & Forecast calculés en arrière-plan (clé = empreinte du jeu de données) ---
+forecast_job = submit_background(("budget_forecast", dataset_fingerprint(df)), compute_budget_forecast, df)
+budget_forecast = None
+if forecast_job.done():
+    try:
+        budget_forecast = background_result(forecast_job)
+    except Exception as e:
+        st.warning(f"Budget & Forecast indisponibles : {e}")
+        budget_forecast = empty_budget_forecast()
+
+@st.cache_data(ttl=3600)
+def load_field_domains(_df, fingerprint):
+    return field_domains(_df)
+
+domains = load_field_domains(df, dataset_fingerprint(df))
 
 # --- Filtres ---
 st.sidebar.title("Filtres")
 
 # Top Filters
-region = st.sidebar.selectbox("Region", sorted(df["Business Area"].dropna().unique()))
+region = st.sidebar.selectbox("Region", domains["Business Area"])
 country_options = df[df["Business Area"] == region]["Controlling Area"].dropna().unique()
 country = st.sidebar.selectbox("Country", sorted(country_options))
 
-years = sorted(df["Year"].unique())
+years = domains["Year"]
 year = st.sidebar.selectbox("Année", years, index=len(years) - 1)
 months = df[df["Year"] == year]["Month"].dropna().unique()
 month = st.sidebar.selectbox("Mois", sorted(months))
 
-settlement = st.sidebar.selectbox("Settlement Type", sorted(df["Document Type"].dropna().unique()))
-currency = st.sidebar.selectbox("Currency", sorted(df["Curr. Key of CoCd Curr."].dropna().unique()))
+settlement = st.sidebar.selectbox("Settlement Type", domains["Document Type"])
+currency = st.sidebar.selectbox("Currency", domains["Curr. Key of CoCd Curr."])
 
 # Left Filters
-subsegment = st.sidebar.selectbox("Sub-segment", sorted(df["Profit Center"].dropna().unique()))
+subsegment = st.sidebar.selectbox("Sub-segment", domains["Profit Center"])
 plant_options = df[df["Controlling Area"] == country]["Plant"].dropna().unique()
 plant = st.sidebar.selectbox("Usine", ["Toutes"] + sorted(plant_options))
-functional_area = st.sidebar.selectbox("Functional Area", sorted(df["Functional Area"].dropna().unique()))
-plant_section = st.sidebar.selectbox("Plant Section", sorted(df["Cost Center"].dropna().unique()))
-revision = st.sidebar.selectbox("Revision", sorted(df["Ref. Document"].dropna().unique()))
-order_type = st.sidebar.selectbox("Order Type", sorted(df["Order"].dropna().unique()))
-work_center = st.sidebar.selectbox("Work Center", sorted(df["WBS Element"].dropna().unique()))
-planner_group = st.sidebar.selectbox("Planner Group", sorted(df["User Name"].dropna().unique()))
+functional_area = st.sidebar.selectbox("Functional Area", domains["Functional Area"])
+plant_section = st.sidebar.selectbox("Plant Section", domains["Cost Center"])
+revision = st.sidebar.selectbox("Revision", domains["Ref. Document"])
+order_type = st.sidebar.selectbox("Order Type", domains["Order"])
+work_center = st.sidebar.selectbox("Work Center", domains["WBS Element"])
+planner_group = st.sidebar.selectbox("Planner Group", domains["User Name"])
 
 # Filtrage combiné
 mask = (
@@ -79,6 +95,10 @@ with tabs[0]:
         .rename(columns={"Posting Date": "Period", "Cost": "Actual"})
     )
     real["Period"] = pd.to_datetime(real["Period"], errors="coerce")
+    if budget_forecast is None:
+        st.info("⏳ Budget et Forecast en cours de calcul, le graphique sera complété automatiquement.")
+    # Copies : les résultats en arrière-plan sont partagés entre sessions
+    dfB, dfF = (frame.copy() for frame in budget_forecast or empty_budget_forecast())
     dfB["Period"] = pd.to_datetime(dfB["Period"], errors="coerce")
     dfF["Period"] = pd.to_datetime(dfF["Period"], errors="coerce")
     comp = pd.merge(real, dfB, on="Period", how="left")
@@ -98,3 +118,14 @@ with tabs[0]:
         st.dataframe(comp)
 
 # [Remaining tabs unchanged]
+
+# --- Calculs encore en cours : la page reste utilisable pendant l'ajustement ;
+# un fragment vérifie les calculs toutes les 2 s et relance la page quand ils sont prêts ---
+@st.fragment(run_every=2)
+def background_status(jobs):
+    if all(job.done() for job in jobs):
+        st.rerun()
+    st.caption("⏳ Calculs en arrière-plan en cours…")
+
+if budget_forecast is None:
+    background_status([forecast_job])
@@ -1,7 +1,18 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import load_real_data, compute_budget_forecast
+import plotly.graph_objects as go
+from utils import load_real_data, dataset_fingerprint
+from forecast import budget_forecast_by, forecast_bands_by, empty_budget_forecast, submit_background, background_result, budget_table
+from cube import build_cost_cube, cube_slice, top_n, TOP_N
+from hierarchy import HIERARCHY, hierarchical_forecast
+from scenarios import SHOCK_FIELDS, scenario_base, simulate_budget
+from figures import cached_figure
+from grid import DETAIL_COLUMNS, PAGE_SIZE, sort_permutation, slice_order, grid_page, detail_valid
+from selection import (
+    build_bitmap_index, select_bits, select_mask, field_states, possible_codes,
+    SEARCH_FIELDS, build_search_index, search_values,
+)
 
 # --- Page Config ---
 st.set_page_config(page_title="Maintenance Cost Dashboard", layout="wide")
@@ -20,142 +31,456 @@ if not uploaded_data:
     st.sidebar.error("⚠️ Charge au moins un fichier de données réelles.")
     st.stop()
 
-df = load_real_data(uploaded_data)
-dfB, dfF = compute_budget_forecast(df)
+# Jeu chargé gardé en session tant que les mêmes fichiers sont chargés :
+# un changement de filtre ne relit ni ne re-hache les fichiers
+upload_key = tuple(f.file_id for f in uploaded_data)
+if st.session_state.get("upload_key") != upload_key:
+    st.session_state["df"] = load_real_data(uploaded_data)
+    st.session_state["upload_key"] = upload_key
+df = st.session_state["df"]
 
-# Top Filters
-region = st.sidebar.selectbox("Region", sorted(df["Business Area"].dropna().unique()))
-country_options = df[df["Business Area"] == region]["Controlling Area"].dropna().unique()
-country = st.sidebar.selectbox("Country", sorted(country_options))
+# --- Budget & Forecast calculés en arrière-plan (clé = empreinte du jeu de données) ---
+# Une paire (dfB, dfF) par tranche Région / Pays / Usine, cumuls "Toutes" compris :
+# changer de tranche = simple lecture, et "Toutes" respecte la Région et le Pays choisis.
+FORECAST_DIMS = ["Business Area", "Controlling Area", "Plant"]
+forecast_job = submit_background(("budget_forecast", dataset_fingerprint(df)), budget_forecast_by, df, FORECAST_DIMS, "Toutes")
+budget_forecast = None
+if forecast_job.done():
+    try:
+        budget_forecast = background_result(forecast_job)
+    except Exception as e:
+        st.warning(f"Budget & Forecast indisponibles : {e}")
+        budget_forecast = {}
 
-years = sorted(df["Year"].unique())
-year = st.sidebar.selectbox("Année", years, index=len(years) - 1)
-months = df[df["Year"] == year]["Month"].dropna().unique()
-month = st.sidebar.selectbox("Mois", sorted(months))
+# Prévision jusqu'à 18 mois avec intervalle à 90 % (trajectoires simulées), aussi en arrière-plan
+bands_job = submit_background(("forecast_bands", dataset_fingerprint(df)), forecast_bands_by, df, FORECAST_DIMS, "Toutes", 18)
+forecast_bands = None
+if bands_job.done():
+    try:
+        forecast_bands = background_result(bands_job)
+    except Exception as e:
+        st.warning(f"Intervalles de prévision indisponibles : {e}")
+        forecast_bands = {}
 
-settlement = st.sidebar.selectbox("Settlement Type", sorted(df["Document Type"].dropna().unique()))
-currency = st.sidebar.selectbox("Currency", sorted(df["Curr. Key of CoCd Curr."].dropna().unique()))
+# Prévision hiérarchique Région → Pays → Usine → Functional Area, cohérente à tous les niveaux
+hierarchy_job = submit_background(("hierarchy_forecast", dataset_fingerprint(df)), hierarchical_forecast, df)
+hierarchy_forecast = None
+if hierarchy_job.done():
+    try:
+        hierarchy_forecast = background_result(hierarchy_job)
+    except Exception as e:
+        st.warning(f"Prévision hiérarchique indisponible : {e}")
+        hierarchy_forecast = pd.DataFrame()
 
-# Left Filters
-subsegment = st.sidebar.selectbox("Sub-segment", sorted(df["Profit Center"].dropna().unique()))
-plant_options = df[df["Controlling Area"] == country]["Plant"].dropna().unique()
-plant = st.sidebar.selectbox("Usine", ["Toutes"] + sorted(plant_options))
-functional_area = st.sidebar.selectbox("Functional Area", sorted(df["Functional Area"].dropna().unique()))
-plant_section = st.sidebar.selectbox("Plant Section", sorted(df["Cost Center"].dropna().unique()))
-revision = st.sidebar.selectbox("Revision", sorted(df["Ref. Document"].dropna().unique()))
-order_type = st.sidebar.selectbox("Order Type", sorted(df["Order"].dropna().unique()))
-work_center = st.sidebar.selectbox("Work Center", sorted(df["WBS Element"].dropna().unique()))
-planner_group = st.sidebar.selectbox("Planner Group", sorted(df["User Name"].dropna().unique()))
-
-# Filtrage combiné
-mask = (
-    (df["Year"] == year) &
-    (df["Month"] == month) &
-    (df["Business Area"] == region) &
-    (df["Controlling Area"] == country)
-)
-if plant != "Toutes":
-    mask &= (df["Plant"] == plant)
-df_filt = df[mask]
-
-# --- Onglets ---
-tabs = st.tabs([
-    "Overview", "Total & Benchmark", "Cost w/o PM",
-    "By Location", "By Equipment", "By Vendor",
-    "By Material", "By Order", "By Stoppages"
-])
-
-with tabs[0]:
-    st.header("Overview – Actual vs Budget vs Forecast")
-    real = (
-        df_filt
-        .groupby(df_filt["Posting Date"].dt.to_period("M"))["Cost"]
-        .sum()
-        .to_timestamp()
-        .reset_index()
-        .rename(columns={"Posting Date": "Period", "Cost": "Actual"})
+# --- Cube de coûts : agrégé une fois par jeu de données, puis simple lecture ---
+# Structures en lecture seule partagées (cube, index, permutations) : cache_resource,
+# sans la copie (pickle) que cache_data refait à chaque appel et à chaque rerun.
+CUBE_FIELDS = ["Year", "Month", "Business Area", "Controlling Area", "Plant"]
+
+@st.cache_resource(ttl=3600)
+def load_cost_cube(_df, fingerprint):
+    return build_cost_cube(_df, CUBE_FIELDS)
+
+cube = load_cost_cube(df, dataset_fingerprint(df))
+
+# --- Index bitmap des filtres + codes des champs de la sidebar (moteur associatif) ---
+@st.cache_resource(ttl=3600)
+def load_bitmap_index(_df, fingerprint):
+    return build_bitmap_index(_df)
+
+bitmap_index = load_bitmap_index(df, dataset_fingerprint(df))
+
+# --- Recherche côté serveur pour Order / Ref. Document / WBS Element ---
+@st.cache_resource(ttl=3600)
+def load_search_indexes(_index, fingerprint):
+    return {
+        field: build_search_index(_index["fields"][field]["values"])
+        for field in SEARCH_FIELDS if field in _index["fields"]
+    }
+
+search_indexes = load_search_indexes(bitmap_index, dataset_fingerprint(df))
+
+# --- Budget du mois suivant par usine, selon la règle de croissance choisie ---
+BUDGET_RULES = {
+    "Croissance moyenne 12 mois": {},
+    "Moyenne des 12 dernières croissances": {"window": 12},
+    "Croissance médiane": {"method": "median"},
+    "Croissance plafonnée à ±20 %": {"cap": 0.2},
+}
+
+# _history : fonction renvoyant les lignes de l'historique, appelée seulement hors cache
+@st.cache_data(ttl=3600)
+def load_budget_table(_history, fingerprint, history_key, rule):
+    return budget_table(_history(), "Plant", **BUDGET_RULES[rule])
+
+@st.cache_data(ttl=3600)
+def load_scenario_base(_history, fingerprint, history_key):
+    return scenario_base(_history(), SHOCK_FIELDS, "Plant")
+
+# Sélection courante, reconstruite depuis l'état des widgets *avant* de les afficher.
+# Chaque liste montre d'abord les valeurs encore possibles compte tenu de tous les
+# autres filtres, puis les valeurs exclues, qui restent sélectionnables : en choisir
+# une retire les sélections des autres champs qui la contredisent (comme QlikView).
+REQUIRED_FIELDS = ["Business Area", "Controlling Area", "Year", "Month"]
+STATE_FIELDS = REQUIRED_FIELDS + [
+    "Document Type", "Curr. Key of CoCd Curr.", "Profit Center", "Plant",
+    "Functional Area", "Cost Center", "User Name",
+]
+# Tous les champs de la sidebar filtrent les lignes (recherche comprise)
+FILTER_FIELDS = STATE_FIELDS + list(SEARCH_FIELDS)
+
+def read_selection():
+    return {
+        field: st.session_state[f"sel_{field}"]
+        for field in FILTER_FIELDS
+        if st.session_state.get(f"sel_{field}") not in (None, "Toutes")
+    }
+
+def mark_changed(field):
+    st.session_state["sel_changed"] = field
+
+selection = read_selection()
+changed = st.session_state.pop("sel_changed", None)
+if not select_bits(bitmap_index, selection).any():
+    # Combinaison vide (valeur exclue choisie, ou jeu de données changé) : le dernier
+    # choix est gardé, puis chaque autre sélection tant qu'il reste des lignes ;
+    # les sélections en conflit sont retirées (un champ obligatoire reprend son défaut)
+    order = ([changed] if changed in selection else []) + [f for f in FILTER_FIELDS if f != changed]
+    kept = {}
+    for field in order:
+        if field not in selection:
+            continue
+        if select_bits(bitmap_index, {**kept, field: selection[field]}).any():
+            kept[field] = selection[field]
+        else:
+            del st.session_state[f"sel_{field}"]
+    selection = read_selection()
+states = field_states(bitmap_index, selection, STATE_FIELDS)
+
+# Valeurs par défaut posées dans l'état avant la création des widgets
+# (premier affichage, ou champ obligatoire libéré par un conflit)
+for field, default in zip(REQUIRED_FIELDS, (0, 0, -1, 0)):
+    possible = states.get(field, ([], []))[0]
+    if st.session_state.get(f"sel_{field}") is None and possible:
+        st.session_state[f"sel_{field}"] = possible[default]
+        selection = read_selection()
+        states = field_states(bitmap_index, selection, STATE_FIELDS)
+
+def field_box(label, field):
+    # Valeurs possibles puis exclues (marquées) ; "Toutes" pour les champs facultatifs
+    possible, excluded = states.get(field, ([], []))
+    marked = set(excluded)
+    options = ([] if field in REQUIRED_FIELDS else ["Toutes"]) + possible + excluded
+    value = st.sidebar.selectbox(
+        label, options, key=f"sel_{field}", on_change=mark_changed, args=(field,),
+        format_func=lambda v: f"{v} (exclu)" if v in marked else str(v),
     )
+    if excluded:
+        st.sidebar.caption(f"{len(excluded)} valeur(s) exclue(s) par les autres filtres")
+    return value
+
+def search_select(label, field):
+    # Seules les correspondances de la page courante sont envoyées au widget
+    if field not in search_indexes:
+        return st.sidebar.selectbox(label, [])
+    text = st.sidebar.text_input(f"{label} – recherche", key=f"search_{field}")
+    page_key = f"page_{field}"
+    # Nouveau texte : retour à la première page
+    if st.session_state.get(f"searched_{field}") != text:
+        st.session_state[f"searched_{field}"] = text
+        st.session_state[page_key] = 1
+    page = st.session_state.get(page_key, 1)
+    allowed = possible_codes(bitmap_index, selection, field)
+    matches, more = search_values(search_indexes[field], text, allowed, page=page - 1)
+    if not matches and page > 1:
+        # Page au-delà des résultats (autres filtres modifiés) : retour à la première
+        page = st.session_state[page_key] = 1
+        matches, more = search_values(search_indexes[field], text, allowed, page=0)
+    # La valeur choisie reste dans la liste même hors de la page ou de la recherche
+    current = st.session_state.get(f"sel_{field}")
+    options = ["Toutes"] + ([current] if current not in (None, "Toutes") and current not in matches else []) + matches
+    value = st.sidebar.selectbox(label, options, key=f"sel_{field}", on_change=mark_changed, args=(field,))
+    if more or page > 1:
+        # Le nombre total de pages n'est pas calculé : au plus une page après la courante
+        st.sidebar.number_input(
+            f"{label} – page", min_value=1, max_value=page + 1 if more else page, step=1, key=page_key
+        )
+    return value
+
+# Top Filters
+region = field_box("Region", "Business Area")
+country = field_box("Country", "Controlling Area")
+year = field_box("Année", "Year")
+month = field_box("Mois", "Month")
+settlement = field_box("Settlement Type", "Document Type")
+currency = field_box("Currency", "Curr. Key of CoCd Curr.")
+
+# Left Filters
+subsegment = field_box("Sub-segment", "Profit Center")
+plant = field_box("Usine", "Plant")
+functional_area = field_box("Functional Area", "Functional Area")
+plant_section = field_box("Plant Section", "Cost Center")
+revision = search_select("Revision", "Ref. Document")
+order_type = search_select("Order Type", "Order")
+work_center = search_select("Work Center", "WBS Element")
+planner_group = field_box("Planner Group", "User Name")
+
+# Clé de la sélection courante pour les calculs mis en cache par vue
+selection_key = tuple(sorted(selection.items()))
+# Tranche Région / Pays / Usine des Budget & Forecast précalculés
+forecast_slice = tuple(selection.get(field, "Toutes") for field in FORECAST_DIMS)
+
+# Historique des règles de budget : filtré par Région / Pays / Usine seulement,
+# jusqu'au mois choisi (la tranche Année + Mois n'a qu'un mois de données)
+HISTORY_FIELDS = ["Business Area", "Controlling Area", "Plant"]
+history_selection = {k: v for k, v in selection.items() if k in HISTORY_FIELDS}
+history_key = (tuple(sorted(history_selection.items())), year, month)
+
+def history_rows():
+    mask = select_mask(bitmap_index, history_selection)
+    if year is not None and month is not None:
+        until = pd.Timestamp(int(year), int(month), 1) + pd.offsets.MonthBegin()
+        mask &= (df["Posting Date"] < until).to_numpy()
+    return df[mask]
+
+# Agrégat d'une vue pour une sélection : calculé à la première visite, relu ensuite.
+# Filtres hors des clés du cube : la vue est agrégée depuis les lignes retenues.
+@st.cache_data(ttl=3600, max_entries=256)
+def load_view(_cube, _df, _index, fingerprint, view, selection_key):
+    selection = dict(selection_key)
+    if set(selection) <= set(CUBE_FIELDS):
+        return cube_slice(_cube, view, selection)
+    rows = _df[select_mask(_index, selection)]
+    return cube_slice(build_cost_cube(rows, [], [view]), view, {})
+
+def view_data(view):
+    return load_view(cube, df, bitmap_index, dataset_fingerprint(df), view, selection_key)
+
+def bar_figure(view, x, **kwargs):
+    # Barres d'une vue ; agrégat et figure ne sont construits qu'en l'absence de cache
+    key = (dataset_fingerprint(df), view, selection_key)
+    return cached_figure(key, lambda: px.bar(view_data(view), x=x, y="Cost", **kwargs))
+
+# Permutations triées de tout le jeu, une par (colonne, sens), pour la grille de détail
+@st.cache_resource(ttl=3600)
+def load_sort_permutation(_df, fingerprint, column, ascending):
+    return sort_permutation(_df, column, ascending)
+
+@st.cache_resource(ttl=3600)
+def load_detail_valid(_df, fingerprint):
+    return detail_valid(_df)
+
+# --- Vues ---
+# Les contrôles propres à un graphique sont dans un fragment : les modifier
+# ne relance que ce fragment, pas le script ni les autres éléments de la vue.
+def overview_table():
+    # Actual (cube) + Budget et Forecast de l'usine choisie, par mois
+    real = view_data("Period").rename(columns={"Cost": "Actual"})
     real["Period"] = pd.to_datetime(real["Period"], errors="coerce")
+    # Copies : les résultats en arrière-plan sont partagés entre sessions
+    dfB, dfF = (frame.copy() for frame in (budget_forecast or {}).get(forecast_slice) or empty_budget_forecast())
     dfB["Period"] = pd.to_datetime(dfB["Period"], errors="coerce")
     dfF["Period"] = pd.to_datetime(dfF["Period"], errors="coerce")
     comp = pd.merge(real, dfB, on="Period", how="left")
     comp = pd.merge(comp, dfF, on="Period", how="left")
+    comp[["Actual", "Budget", "Forecast"]] = comp[["Actual", "Budget", "Forecast"]].apply(pd.to_numeric, errors="coerce")
+    return comp
+
+def overview_figure(bands):
+    fig = px.line(
+        overview_table(),
+        x="Period",
+        y=["Actual", "Budget", "Forecast"],
+        labels={"value": "Coût", "Period": "Mois"},
+        markers=True
+    )
+    if bands is not None:
+        fig.add_trace(go.Scatter(
+            x=bands["Period"], y=bands["Upper"], mode="lines",
+            line=dict(width=0), showlegend=False, hoverinfo="skip"
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands["Period"], y=bands["Lower"], mode="lines", line=dict(width=0),
+            fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name="Intervalle 90 %"
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands["Period"], y=bands["Forecast"], mode="lines+markers",
+            line=dict(dash="dash"), name="Forecast multi-mois"
+        ))
+    return fig
+
+@st.fragment
+def overview_chart():
+    if budget_forecast is None:
+        st.info("⏳ Budget et Forecast en cours de calcul, le graphique sera complété automatiquement.")
+    bands = (forecast_bands or {}).get(forecast_slice)
+    horizon = None
+    if bands is not None:
+        horizon = st.slider("Horizon de prévision (mois)", 1, len(bands), min(12, len(bands)))
+        bands = bands.head(horizon)
+    # La figure dépend aussi de l'état des calculs en arrière-plan et de l'horizon
+    key = (
+        dataset_fingerprint(df), "Overview", selection_key, forecast_slice,
+        budget_forecast is not None, forecast_bands is not None, horizon,
+    )
     try:
-        comp[["Actual", "Budget", "Forecast"]] = comp[["Actual", "Budget", "Forecast"]].apply(pd.to_numeric, errors="coerce")
-        fig = px.line(
-            comp,
-            x="Period",
-            y=["Actual", "Budget", "Forecast"],
-            labels={"value": "Coût", "Period": "Mois"},
-            markers=True
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(cached_figure(key, overview_figure, bands), use_container_width=True)
     except Exception as e:
         st.warning(f"Erreur dans l'affichage du graphique : {e}")
-        st.dataframe(comp)
+        st.dataframe(overview_table())
+
+def show_overview():
+    st.header("Overview – Actual vs Budget vs Forecast")
+    overview_chart()
+
+    if hierarchy_forecast is not None and not hierarchy_forecast.empty:
+        with st.expander("🌳 Prévision hiérarchique 12 mois (Région → Pays → Usine → Functional Area)"):
+            # Noeuds sous la sélection courante ; la somme des enfants égale le parent
+            nodes = hierarchy_forecast
+            for field in HIERARCHY:
+                if field in selection:
+                    nodes = nodes[nodes[field] == selection[field]]
+            table = (
+                nodes
+                .groupby(["Level"] + HIERARCHY, dropna=False, sort=False)["Forecast"]
+                .sum()
+                .reset_index()
+                .rename(columns={"Forecast": "Forecast 12 mois"})
+            )
+            st.dataframe(table)
 
     # Tableau de détails
     st.markdown("### 🔍 Détail par ligne")
-    columns = ["Order", "Vendor", "Material", "Account Number", "Year", "Month", "Cost"]
-    detail_df = df_filt[columns].dropna(how="all", subset=["Order", "Cost"])
-    st.dataframe(detail_df.sort_values("Cost", ascending=False))
+    detail_grid()
 
-with tabs[1]:
+@st.fragment
+def detail_grid():
+    # Seule la page visible est extraite et envoyée ; tri et pagination ne relancent que la grille
+    fingerprint = dataset_fingerprint(df)
+    columns = [column for column in DETAIL_COLUMNS if column in df.columns]
+    sort_col, direction, page = st.columns([2, 2, 1])
+    column = sort_col.selectbox("Trier par", columns, index=columns.index("Cost") if "Cost" in columns else 0)
+    ascending = direction.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True) == "Croissant"
+    mask = select_mask(bitmap_index, selection) & load_detail_valid(df, fingerprint)
+    order = slice_order(load_sort_permutation(df, fingerprint, column, ascending), mask)
+    pages = max((len(order) + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    if st.session_state.get("detail_page", 1) > pages:
+        st.session_state["detail_page"] = pages
+    number = page.number_input("Page", min_value=1, max_value=pages, step=1, key="detail_page")
+    st.caption(f"{len(order)} lignes – page {number} / {pages}")
+    st.dataframe(grid_page(df, order, number - 1, columns=columns), hide_index=True)
+
+def show_benchmark():
     st.header("Total Cost & Benchmark")
-    agg = df_filt.groupby("Plant")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-    st.plotly_chart(px.bar(agg, x="Plant", y="Cost", labels={"Cost": "Coût total"}), use_container_width=True)
+    st.plotly_chart(bar_figure("Plant", "Plant", labels={"Cost": "Coût total"}), use_container_width=True)
+    budget_panel()
 
-with tabs[2]:
-    st.header("Cost without PM order")
-    wo_pm = df_filt[df_filt["Order"].isna()]
-    agg = (
-        wo_pm
-        .groupby(wo_pm["Posting Date"].dt.to_period("M"))["Cost"]
-        .sum()
-        .to_timestamp()
-        .reset_index()
+@st.fragment
+def budget_panel():
+    # Règle de budget et chocs what-if : relance limitée à ce panneau
+    rule = st.selectbox("Règle de budget", list(BUDGET_RULES))
+    budgets = load_budget_table(history_rows, dataset_fingerprint(df), history_key, rule)
+    st.dataframe(budgets.sort_values("Budget", ascending=False))
+
+    # --- What-if : chocs multiplicatifs par Vendor / Material / Plant, milliers de scénarios ---
+    st.markdown("### 🎲 Simulation what-if du budget")
+    shocks = st.data_editor(
+        pd.DataFrame({"Champ": ["Material"], "Valeur": [""], "Facteur": [1.08], "Incertitude": [0.03]}),
+        num_rows="dynamic",
+        column_config={
+            "Champ": st.column_config.SelectboxColumn(options=SHOCK_FIELDS, required=True),
+            "Facteur": st.column_config.NumberColumn(min_value=0.01, step=0.01, help="1.08 = +8 %"),
+            "Incertitude": st.column_config.NumberColumn(min_value=0.0, step=0.01, help="Écart-type relatif"),
+        },
+        key="what_if_shocks",
     )
-    agg.columns = ["Period", "Cost"]
-    st.plotly_chart(px.bar(agg, x="Period", y="Cost", labels={"Cost": "Coût sans PM"}), use_container_width=True)
+    shocks = [
+        {"field": row["Champ"], "value": row["Valeur"], "factor": row["Facteur"], "sd": 0.0 if pd.isna(row["Incertitude"]) else row["Incertitude"]}
+        for _, row in shocks.dropna(subset=["Champ", "Facteur"]).iterrows()
+        if str(row["Valeur"]).strip()
+    ]
+    base = load_scenario_base(history_rows, dataset_fingerprint(df), history_key)
+    outcome = simulate_budget(base, shocks, **BUDGET_RULES[rule])
+    st.dataframe(outcome.rename(columns={"Base": "Budget sans choc", "Mean": "Moyenne"}))
 
-with tabs[3]:
+def show_without_pm():
+    st.header("Cost without PM order")
+    st.plotly_chart(bar_figure("Period w/o PM", "Period", labels={"Cost": "Coût sans PM"}), use_container_width=True)
+
+def show_location():
     st.header("Cost at Functional Location")
-    agg = df_filt.groupby("Functional Area")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-    st.plotly_chart(px.bar(agg, x="Functional Area", y="Cost"), use_container_width=True)
+    st.plotly_chart(bar_figure("Functional Area", "Functional Area"), use_container_width=True)
 
-with tabs[4]:
+@st.fragment
+def top_bar(view):
+    # Top N + "Other" : le graphique garde une taille constante quelle que soit la cardinalité ;
+    # la recherche et la page permettent d'explorer la queue sans tout envoyer au navigateur
+    agg = view_data(view)
+    search, page = st.columns([3, 1])
+    text = search.text_input("Filtrer", key=f"top_search_{view}")
+    if text:
+        agg = agg[agg[view].astype(str).str.contains(text, case=False, regex=False).to_numpy()]
+    pages = max((len(agg) + TOP_N - 1) // TOP_N, 1)
+    if st.session_state.get(f"top_page_{view}", 1) > pages:
+        st.session_state[f"top_page_{view}"] = pages
+    number = page.number_input("Page", min_value=1, max_value=pages, step=1, key=f"top_page_{view}")
+    total = len(agg)
+    st.caption(f"{total} membres – rangs {(number - 1) * TOP_N + 1} à {min(number * TOP_N, total)}")
+    key = (dataset_fingerprint(df), view, selection_key, text, number)
+    fig = cached_figure(key, lambda: px.bar(top_n(agg, view, TOP_N, number - 1)[0], x=view, y="Cost"))
+    st.plotly_chart(fig, use_container_width=True)
+
+def show_equipment():
     st.header("Cost at Equipment")
-    if "Equipment" in df_filt.columns:
-        agg = df_filt.groupby("Equipment")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-        st.plotly_chart(px.bar(agg, x="Equipment", y="Cost"), use_container_width=True)
+    if "Equipment" in df.columns:
+        top_bar("Equipment")
     else:
         st.warning("La colonne 'Equipment' est absente des fichiers chargés.")
 
-with tabs[5]:
+def show_vendor():
     st.header("Cost at Vendor")
-    agg = df_filt.groupby("Vendor")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-    st.plotly_chart(px.bar(agg, x="Vendor", y="Cost"), use_container_width=True)
+    top_bar("Vendor")
 
-with tabs[6]:
+def show_material():
     st.header("Cost at Material")
-    agg = df_filt.groupby("Material")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-    st.plotly_chart(px.bar(agg, x="Material", y="Cost"), use_container_width=True)
+    top_bar("Material")
 
-with tabs[7]:
+def show_order():
     st.header("Cost at Order")
-    agg = df_filt.groupby("Order")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
-    st.plotly_chart(px.bar(agg, x="Order", y="Cost"), use_container_width=True)
+    top_bar("Order")
 
-with tabs[8]:
+def show_stoppages():
     st.header("Cost at Stoppages")
-    if "Stop ID" in df_filt.columns and "Stop Cause" in df_filt.columns:
-        agg = (
-            df_filt
-            .groupby(["Stop ID", "Stop Cause"])["Cost"]
-            .sum()
-            .reset_index()
-            .sort_values("Cost", ascending=False)
-        )
-        st.plotly_chart(px.bar(agg, x="Stop ID", y="Cost", hover_data=["Stop Cause"]), use_container_width=True)
+    if "Stop ID" in df.columns and "Stop Cause" in df.columns:
+        st.plotly_chart(bar_figure("Stoppages", "Stop ID", hover_data=["Stop Cause"]), use_container_width=True)
     else:
         st.warning("Colonnes 'Stop ID' et 'Stop Cause' absentes des données.")
+
+# --- Navigation : seule la vue active est agrégée et affichée ---
+VIEWS = {
+    "Overview": show_overview,
+    "Total & Benchmark": show_benchmark,
+    "Cost w/o PM": show_without_pm,
+    "By Location": show_location,
+    "By Equipment": show_equipment,
+    "By Vendor": show_vendor,
+    "By Material": show_material,
+    "By Order": show_order,
+    "By Stoppages": show_stoppages,
+}
+view = st.radio("Vue", list(VIEWS), horizontal=True, key="view", label_visibility="collapsed")
+VIEWS[view]()
+
+# --- Calculs encore en cours : la page reste utilisable pendant l'ajustement ;
+# un fragment vérifie les calculs toutes les 2 s et relance la page quand ils sont prêts ---
+@st.fragment(run_every=2)
+def background_status(jobs):
+    if all(job.done() for job in jobs):
+        st.rerun()
+    st.caption("⏳ Calculs en arrière-plan en cours…")
+
+# (seul l'Overview affiche ces résultats ; les autres vues ne relancent pas)
+jobs = ((forecast_job, budget_forecast), (bands_job, forecast_bands), (hierarchy_job, hierarchy_forecast))
+pending = [job for job, result in jobs if result is None]
+if view == "Overview" and pending:
+    background_status(pending)
@@ -0,0 +1,120 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from forecast import fit_holt_batch, growth_budget, holt_forecast, slice_matrix
+
+# --- Backtest à origines glissantes : budget (croissance 12 mois), Holt, naïf ---
+# Pour chaque origine o, on ajuste sur les mois [0, o) de toutes les séries d'un coup
+# et on compare aux mois [o, o + horizon). Les origines sont réparties entre processus.
+METHODS = ["Budget", "Holt", "Naïf"]
+MIN_TRAIN = 12
+
+def _predict(train, horizon):
+    # (méthodes, horizon, séries) ; le budget et le naïf sont plats sur l'horizon
+    budget = growth_budget(train)
+    holt = holt_forecast(fit_holt_batch(train), horizon)
+    naive = train[-1]
+    return np.stack([
+        np.broadcast_to(budget, holt.shape),
+        holt,
+        np.broadcast_to(naive, holt.shape),
+    ])
+
+def _score_origins(Y, origins, horizon):
+    # Sommes et effectifs des erreurs, (méthodes, horizon, séries), pour un lot d'origines
+    shape = (len(METHODS), horizon, Y.shape[1])
+    ape_sum, ape_n = np.zeros(shape), np.zeros(shape)
+    ase_sum, ase_n = np.zeros(shape), np.zeros(shape)
+    for o in origins:
+        train = Y[:o]
+        actual = Y[o:o + horizon]
+        h = len(actual)
+        err = np.abs(_predict(train, horizon)[:, :h] - actual)
+        # MAPE : mois à réel nul exclus ; MASE : échelle = écart moyen du naïf 1 mois en apprentissage
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ape = err / np.abs(actual)
+            ase = err / np.abs(np.diff(train, axis=0)).mean(axis=0)
+        for total, count, values in ((ape_sum, ape_n, ape), (ase_sum, ase_n, ase)):
+            ok = np.isfinite(values)
+            total[:, :h] += np.where(ok, values, 0.0)
+            count[:, :h] += ok
+    return ape_sum, ape_n, ase_sum, ase_n
+
+def backtest(wide, horizon=12, min_train=MIN_TRAIN, workers=None):
+    # wide : matrice mois x séries (slice_matrix). Renvoie un DataFrame long
+    # Method, <dim>, Horizon, MAPE, MASE, Folds.
+    dim = wide.columns.name or "Series"
+    Y = wide.to_numpy(dtype=float)
+    origins = list(range(max(min_train, 2), len(Y)))
+    if not origins:
+        return pd.DataFrame(columns=["Method", dim, "Horizon", "MAPE", "MASE", "Folds"])
+    workers = min(len(origins), workers or os.cpu_count() or 1)
+    batches = [origins[i::workers] for i in range(workers)]
+    parts = None
+    if workers > 1:
+        # Un lot d'origines par processus ; chaque lot traite toutes les séries en bloc
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(
+                    _score_origins, [Y] * workers, batches, [horizon] * workers
+                ))
+        except (BrokenProcessPool, OSError):
+            parts = None
+    if parts is None:
+        parts = [_score_origins(Y, batch, horizon) for batch in batches]
+    ape_sum, ape_n, ase_sum, ase_n = (sum(p[i] for p in parts) for i in range(4))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mape = ape_sum / ape_n
+        mase = ase_sum / ase_n
+    m, h, s = np.meshgrid(
+        np.arange(len(METHODS)), np.arange(horizon), np.arange(Y.shape[1]), indexing="ij"
+    )
+    out = pd.DataFrame({
+        "Method": np.asarray(METHODS)[m.ravel()],
+        dim: np.asarray(wide.columns, dtype=object)[s.ravel()],
+        "Horizon": h.ravel() + 1,
+        "MAPE": mape.ravel(),
+        "MASE": mase.ravel(),
+        "Folds": ase_n.ravel().astype(int),
+    })
+    return out[out["Folds"] > 0].reset_index(drop=True)
+
+def backtest_by(df, dim="Plant", total="Toutes", horizon=12, min_train=MIN_TRAIN, workers=None):
+    # Scores par méthode, membre de dim (plus le total) et horizon
+    wide = slice_matrix(df, dim, total)
+    wide.columns.name = dim
+    return backtest(wide, horizon, min_train, workers)
+
+def summarize(scores):
+    # Vue compacte : une ligne par méthode et horizon, moyenne sur les séries
+    return (
+        scores
+        .groupby(["Method", "Horizon"])[["MAPE", "MASE"]]
+        .mean()
+        .reset_index()
+    )
+
+# --- Lancement nocturne : python backtest.py fichier1.xlsx fichier2.xlsx ... ---
+if __name__ == "__main__":
+    from util import load_real_data
+
+    parser = argparse.ArgumentParser(description="Backtest des méthodes Budget / Forecast")
+    parser.add_argument("files", nargs="+", help="Exports SAP (.xlsx)")
+    parser.add_argument("--dim", default="Plant")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--min-train", type=int, default=MIN_TRAIN)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="backtest.csv")
+    args = parser.parse_args()
+
+    scores = backtest_by(
+        load_real_data(args.files), args.dim, horizon=args.horizon,
+        min_train=args.min_train, workers=args.workers,
+    )
+    scores.to_csv(args.out, index=False)
+    print(summarize(scores).to_string(index=False))
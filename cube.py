@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# --- Cube de coûts pré-agrégé ---
+# Chaque vue = colonnes de regroupement d'un onglet ; le cube croise ces colonnes
+# avec les clés de filtre (Année, Mois, Usine...) une seule fois par jeu de données.
+CUBE_VIEWS = {
+    "Period": ["Period"],
+    "Period w/o PM": ["Period"],
+    "Plant": ["Plant"],
+    "Functional Area": ["Functional Area"],
+    "Equipment": ["Equipment"],
+    "Vendor": ["Vendor"],
+    "Material": ["Material"],
+    "Order": ["Order"],
+    "Stoppages": ["Stop ID", "Stop Cause"],
+}
+
+CUBE_KEYS = ["Year", "Month", "Plant"]
+
+# Vues à forte cardinalité : affichées en top N + une barre "Other" (voir top_n)
+TOP_N_VIEWS = ("Equipment", "Vendor", "Material", "Order")
+TOP_N = 30
+
+def build_cost_cube(df, keys=CUBE_KEYS, views=None):
+    # views : sous-ensemble de CUBE_VIEWS à construire (toutes par défaut)
+    keys = [k for k in keys if k in df.columns]
+    base = df.assign(Period=df["Posting Date"].dt.to_period("M").dt.to_timestamp())
+    cube = {}
+    for view, dims in CUBE_VIEWS.items():
+        if views is not None and view not in views:
+            continue
+        if not all(d in base.columns for d in dims):
+            continue
+        src = base[base["Order"].isna()] if view == "Period w/o PM" else base
+        by = list(dict.fromkeys(keys + dims))
+        # dropna=False : une ligne sans Usine reste comptée dans "Toutes"
+        cube[view] = (
+            src
+            .groupby(by, observed=True, dropna=False)["Cost"]
+            .sum()
+            .reset_index()
+        )
+    return cube
+
+def cube_slice(cube, view, selections):
+    # selections : {clé: valeur} ; une clé absente est agrégée (ex. Usine "Toutes")
+    dims = CUBE_VIEWS[view]
+    if view not in cube:
+        return pd.DataFrame(columns=dims + ["Cost"])
+    t = cube[view]
+    mask = np.ones(len(t), dtype=bool)
+    for col, val in selections.items():
+        mask &= (t[col] == val).to_numpy(dtype=bool, na_value=False)
+    agg = (
+        t[mask]
+        .dropna(subset=dims)
+        .groupby(dims, observed=True)["Cost"]
+        .sum()
+        .reset_index()
+    )
+    if view.startswith("Period"):
+        return agg.sort_values("Period", ignore_index=True)
+    if view in TOP_N_VIEWS:
+        # Pas de tri complet : top_n ne classe que les barres affichées
+        return agg
+    return agg.sort_values("Cost", ascending=False, ignore_index=True)
+
+def top_n(agg, label, n=TOP_N, page=0, value="Cost"):
+    # Rangs [page * n, (page + 1) * n) par valeur décroissante, suivis d'une barre
+    # "Other" qui cumule tous les rangs suivants. argpartition isole la fenêtre en O(len) ;
+    # seules les n barres visibles sont triées. Renvoie (barres, nombre de membres).
+    values = agg[value].to_numpy(dtype=float)
+    labels = agg[label].astype(object).to_numpy()
+    total = len(values)
+    if total == 0:
+        return pd.DataFrame({label: [], value: []}), 0
+    start = min(page, (total - 1) // n) * n
+    end = min(start + n, total)
+    order = -values
+    idx = np.argpartition(order, sorted({start, end - 1}))
+    window = idx[start:end]
+    window = window[np.argsort(order[window], kind="stable")]
+    bars = pd.DataFrame({label: labels[window], value: values[window]})
+    rest = idx[end:]
+    if len(rest):
+        other = pd.DataFrame({label: [f"Other ({len(rest)})"], value: [values[rest].sum()]})
+        bars = pd.concat([bars, other], ignore_index=True)
+    return bars, total
@@ -0,0 +1,26 @@
+import threading
+from collections import OrderedDict
+
+# --- Cache LRU des figures construites ---
+# Partagé par toutes les sessions du serveur ; la clé porte l'empreinte du jeu de données,
+# la vue et l'état des filtres, donc revenir à une sélection déjà vue ne recalcule rien.
+# La figure est gardée telle quelle (pas d'aller-retour JSON ni de revalidation) :
+# les pages la passent à st.plotly_chart sans la modifier.
+MAX_FIGURES = 128
+_FIGURES = OrderedDict()
+_FIGURES_LOCK = threading.Lock()
+
+def cached_figure(key, build, *args, **kwargs):
+    # key : (empreinte, vue, sélection, contrôles...) ; build(*args, **kwargs) -> go.Figure,
+    # appelé seulement si la figure n'est pas en cache (agrégat compris)
+    with _FIGURES_LOCK:
+        fig = _FIGURES.get(key)
+        if fig is not None:
+            _FIGURES.move_to_end(key)
+    if fig is None:
+        fig = build(*args, **kwargs)
+        with _FIGURES_LOCK:
+            _FIGURES[key] = fig
+            while len(_FIGURES) > MAX_FIGURES:
+                _FIGURES.popitem(last=False)
+    return fig
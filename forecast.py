@@ -0,0 +1,422 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from util import CACHE_DIR, dataset_fingerprint
+
+# --- Calculs de prévision en arrière-plan ---
+# Un seul exécuteur par processus serveur, partagé par toutes les sessions :
+# la page s'affiche pendant que le modèle tourne, puis relance quand c'est prêt.
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="forecast")
+_JOBS = OrderedDict()
+_JOBS_LOCK = threading.Lock()
+MAX_JOBS = 16
+
+def _job_arg(value):
+    # Forme hachable d'un argument : empreinte pour un DataFrame, tuple pour une liste
+    if isinstance(value, pd.DataFrame):
+        return ("DataFrame", dataset_fingerprint(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_job_arg(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+def _job_key(key, fn, args, kwargs):
+    # Le calcul fait partie de la clé : deux pages qui lancent des fonctions différentes
+    # (ou une même fonction avec d'autres arguments) sous le même nom ne se croisent pas
+    code = getattr(fn, "__code__", None)
+    name = (getattr(fn, "__module__", None), getattr(fn, "__qualname__", repr(fn)), code and code.co_filename)
+    return (
+        key, name,
+        tuple(_job_arg(a) for a in args),
+        tuple(sorted((k, _job_arg(v)) for k, v in kwargs.items())),
+    )
+
+def submit_background(key, fn, *args, **kwargs):
+    # key : (nom du calcul, empreinte du jeu de données...) ; un seul calcul par
+    # (clé, fonction, arguments)
+    key = _job_key(key, fn, args, kwargs)
+    with _JOBS_LOCK:
+        job = _JOBS.get(key)
+        if job is None:
+            job = _JOBS[key] = _EXECUTOR.submit(fn, *args, **kwargs)
+            while len(_JOBS) > MAX_JOBS:
+                _JOBS.popitem(last=False)
+        else:
+            _JOBS.move_to_end(key)
+    return job
+
+def background_result(job):
+    # Résultat d'un calcul terminé. En cas d'échec, le calcul est retiré du registre
+    # (il sera relancé au prochain affichage) et l'exception est relevée.
+    try:
+        return job.result()
+    except Exception:
+        with _JOBS_LOCK:
+            for key in [key for key, other in _JOBS.items() if other is job]:
+                del _JOBS[key]
+        raise
+
+# --- Série mensuelle large : une colonne par membre d'une dimension ---
+def monthly_matrix(df, dim=None):
+    # Mois manquants = 0 (aucune imputation), ordre chronologique continu.
+    # dim : un champ, ou une liste de champs (colonnes = tuples de membres)
+    period = df["Posting Date"].dt.to_period("M")
+    if dim is None:
+        wide = df.groupby(period)["Cost"].sum().to_frame("Total")
+    else:
+        dims = [dim] if isinstance(dim, str) else list(dim)
+        wide = (
+            df
+            .groupby([period] + [df[d] for d in dims], observed=True)["Cost"]
+            .sum()
+            .unstack(list(range(1, len(dims) + 1)), fill_value=0.0)
+        )
+    if wide.empty:
+        return wide
+    full = pd.period_range(wide.index.min(), wide.index.max(), freq="M")
+    wide = wide.reindex(full, fill_value=0.0)
+    wide.index = wide.index.to_timestamp()
+    return wide.astype(float)
+
+# --- Holt (tendance additive, sans saison) ajusté sur toute une matrice d'un coup ---
+# Forme à correction d'erreur : l = l + b + a*e ; b = b + a*b_*e, e = y - (l + b)
+ALPHA_GRID = np.linspace(0.05, 0.95, 10)
+BETA_GRID = np.linspace(0.0, 0.9, 10)
+
+def _holt_run(Y, alpha, beta):
+    # Y (T, S) ; alpha, beta (G, S) -> SSE, niveau et tendance finaux (G, S)
+    shape = np.broadcast_shapes(alpha.shape, Y.shape[1:])
+    level = np.broadcast_to(Y[0], shape).copy()
+    trend = np.broadcast_to(Y[1] - Y[0], shape).copy()
+    sse = np.zeros(shape)
+    for t in range(1, len(Y)):
+        err = Y[t] - (level + trend)
+        sse += err * err
+        level += trend + alpha * err
+        trend += alpha * beta * err
+    return sse, level, trend
+
+def _best(Y, alpha, beta):
+    sse, level, trend = _holt_run(Y, alpha, beta)
+    k = np.argmin(sse, axis=0)
+    cols = np.arange(Y.shape[1])
+    return alpha[k, cols], beta[k, cols], sse[k, cols], level[k, cols], trend[k, cols]
+
+def fit_holt_batch(Y):
+    # Y : (T mois, S séries). Grille grossière puis affinage local, série par série.
+    Y = np.asarray(Y, dtype=float)
+    S = Y.shape[1]
+    if len(Y) < 2:
+        last = Y[-1] if len(Y) else np.zeros(S)
+        zeros = np.zeros(S)
+        return {"alpha": zeros, "beta": zeros, "sse": zeros, "level": last.copy(), "trend": zeros.copy()}
+    a, b = np.meshgrid(ALPHA_GRID, BETA_GRID, indexing="ij")
+    a = np.repeat(a.reshape(-1, 1), S, axis=1)
+    b = np.repeat(b.reshape(-1, 1), S, axis=1)
+    alpha, beta, *_ = _best(Y, a, b)
+    step = np.linspace(-0.05, 0.05, 5)
+    da, db = np.meshgrid(step, step, indexing="ij")
+    a = np.clip(alpha + da.reshape(-1, 1), 0.01, 1.0)
+    b = np.clip(beta + db.reshape(-1, 1), 0.0, 1.0)
+    alpha, beta, sse, level, trend = _best(Y, a, b)
+    return {"alpha": alpha, "beta": beta, "sse": sse, "level": level, "trend": trend}
+
+def holt_forecast(fit, horizon=1):
+    # (horizon, S) : niveau + h * tendance
+    h = np.arange(1, horizon + 1).reshape(-1, 1)
+    return fit["level"] + h * fit["trend"]
+
+# --- Mise à jour incrémentale quand de nouveaux mois arrivent ---
+# L'état ajusté (paramètres, niveau, tendance, historique) est conservé par série ;
+# si l'historique connu est inchangé, on fait seulement avancer la récursion.
+REFIT_EVERY = 12
+
+def _holt_step(fit, Y):
+    fit = {k: v.copy() for k, v in fit.items()}
+    for y in Y:
+        err = y - (fit["level"] + fit["trend"])
+        fit["sse"] += err * err
+        fit["level"] += fit["trend"] + fit["alpha"] * err
+        fit["trend"] += fit["alpha"] * fit["beta"] * err
+    return fit
+
+def fit_holt_incremental(wide, state=None):
+    # wide : matrice mois x séries (monthly_matrix) ; state : renvoyé par l'appel précédent.
+    # Renvoie (fit aligné sur wide.columns, nouvel état à conserver).
+    Y = wide.to_numpy(dtype=float)
+    columns = list(wide.columns)
+    T0 = len(state["periods"]) if state else 0
+    reuse = (
+        state is not None
+        and state["updates"] < REFIT_EVERY
+        and 2 <= T0 <= len(wide)
+        and wide.index[:T0].equals(state["periods"])
+    )
+    keys = ("alpha", "beta", "sse", "level", "trend")
+    fit = {k: np.zeros(len(columns)) for k in keys}
+    refit = list(range(len(columns)))
+    if reuse:
+        pos = {c: i for i, c in enumerate(state["columns"])}
+        known = [j for j, c in enumerate(columns) if c in pos]
+        src = [pos[columns[j]] for j in known]
+        same = np.isclose(Y[:T0, known], state["history"][:, src], rtol=1e-9, atol=1e-6).all(axis=0)
+        kept = [j for j, ok in zip(known, same) if ok]
+        kept_src = [i for i, ok in zip(src, same) if ok]
+        stepped = _holt_step({k: state["fit"][k][kept_src] for k in keys}, Y[T0:, kept])
+        for k in keys:
+            fit[k][kept] = stepped[k]
+        refit = sorted(set(refit) - set(kept))
+    if refit:
+        # Nouvelles séries ou historique modifié : ajustement complet de ces colonnes seulement
+        fresh = fit_holt_batch(Y[:, refit])
+        for k in keys:
+            fit[k][refit] = fresh[k]
+    updates = state["updates"] + 1 if reuse and len(wide) > T0 else (state["updates"] if reuse else 0)
+    new_state = {"periods": wide.index, "columns": columns, "history": Y, "fit": fit, "updates": updates}
+    return fit, new_state
+
+# Lignée d'un jeu de données = premier mois + coûts totaux de ses LINEAGE_MONTHS premiers mois :
+# un jeu prolongé (mois ajoutés, nouveaux membres) garde sa lignée et son état,
+# un autre jeu a le sien (les deux ne s'écrasent plus)
+LINEAGE_MONTHS = 12
+_STATE_LOCK = threading.Lock()
+
+def _state_path(name):
+    return CACHE_DIR / f"{name}.pkl"
+
+def series_lineage(wide):
+    # Empreinte de lignée d'une matrice mois x séries (voir LINEAGE_MONTHS)
+    head = np.round(wide.to_numpy(dtype=float)[:LINEAGE_MONTHS].sum(axis=1), 6)
+    return hashlib.sha256(repr((str(wide.index[0]), head.tolist())).encode()).hexdigest()[:16]
+
+def _state_name(dim, wide, kind="holt"):
+    return kind + "-" + (dim if isinstance(dim, str) else "-".join(dim)) + "-" + series_lineage(wide)
+
+def refresh_holt(wide, name):
+    # Comme fit_holt_incremental, avec l'état conservé sur disque à côté du cache Parquet.
+    # Verrou : les calculs en arrière-plan (budget, intervalles) partagent le même état.
+    path = _state_path(name)
+    with _STATE_LOCK:
+        state = None
+        if path.exists():
+            try:
+                with open(path, "rb") as fh:
+                    state = pickle.load(fh)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                state = None
+        fit, state = fit_holt_incremental(wide, state)
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as fh:
+                pickle.dump(state, fh)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    return fit
+
+def forecast_by(df, dim, horizon=1):
+    # Prévision Holt pour chaque membre de dim (Plant, Functional Area, Equipment...)
+    wide = monthly_matrix(df, dim)
+    if wide.empty:
+        return pd.DataFrame(columns=[dim, "Period", "Forecast"])
+    fit = fit_holt_batch(wide.to_numpy())
+    periods = pd.date_range(wide.index[-1], periods=horizon + 1, freq="MS")[1:]
+    fc = pd.DataFrame(holt_forecast(fit, horizon), index=periods, columns=wide.columns)
+    fc.index.name = "Period"
+    long = fc.reset_index().melt(id_vars="Period", var_name=dim, value_name="Forecast")
+    return long[[dim, "Period", "Forecast"]]
+
+# --- Budget & Forecast par tranche (une entrée par membre + le total) ---
+def _budget_frames(periods, history, budget_next, forecast_next):
+    next_period = periods[-1] + pd.offsets.MonthBegin()
+    index = list(periods) + [next_period]
+    dfB = pd.DataFrame({"Period": index, "Budget": list(history) + [budget_next]})
+    dfF = pd.DataFrame({"Period": index, "Forecast": list(history) + [forecast_next]})
+    for dfx in (dfB, dfF):
+        dfx["Year"] = dfx["Period"].dt.year
+        dfx["Month"] = dfx["Period"].dt.month
+    return dfB, dfF
+
+def slice_matrix(df, dim="Plant", total="Toutes"):
+    # Matrice mois x (total + membres de dim), sur la même plage de mois.
+    # dim en liste (ex. Région, Pays, Usine) : une colonne par tranche de chaque niveau
+    # de cumul, nommée par un tuple complété par total ("EU", "Toutes", "Toutes")...
+    overall = monthly_matrix(df)
+    if isinstance(dim, str):
+        if overall.empty:
+            return overall.rename(columns={"Total": total})
+        wide = monthly_matrix(df, dim).reindex(overall.index, fill_value=0.0)
+        wide.insert(0, total, overall["Total"])
+        return wide
+    dims = list(dim)
+    members = [(total,) * len(dims)]
+    parts = [overall.to_numpy()]
+    for depth in range(1, len(dims) + 1) if not overall.empty else ():
+        part = monthly_matrix(df, dims[:depth]).reindex(overall.index, fill_value=0.0)
+        fill = (total,) * (len(dims) - depth)
+        members += [(c if isinstance(c, tuple) else (c,)) + fill for c in part.columns]
+        parts.append(part.to_numpy())
+    columns = pd.Index(members, tupleize_cols=False)
+    return pd.DataFrame(np.hstack(parts), index=overall.index, columns=columns)
+
+def empty_budget_forecast():
+    return (
+        pd.DataFrame(columns=["Period", "Budget", "Year", "Month"]),
+        pd.DataFrame(columns=["Period", "Forecast", "Year", "Month"]),
+    )
+
+# Variantes de la règle de croissance : "mean" (règle d'origine), "median" ;
+# window = N dernières croissances 12 mois seulement ; cap = croissance bornée à ±cap
+GROWTH_METHODS = ("mean", "median")
+
+def growth_rates(Y, method="mean", window=None, cap=None, default=0.05):
+    # Croissance 12 mois par série d'une matrice (T mois, S séries), calculée d'un coup ;
+    # default si moins de 13 mois ou aucune croissance définie (réel nul un an avant)
+    if method not in GROWTH_METHODS:
+        raise ValueError(f"Méthode de croissance inconnue : {method}")
+    Y = np.asarray(Y, dtype=float)
+    growth = np.full(Y.shape[1], default)
+    if len(Y) >= 13:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = Y[12:] / Y[:-12] - 1
+        ratio[~np.isfinite(ratio)] = np.nan
+        if window:
+            ratio = ratio[-window:]
+        counts = np.sum(~np.isnan(ratio), axis=0)
+        if method == "mean":
+            stat = np.nansum(ratio, axis=0) / np.maximum(counts, 1)
+        else:
+            # nanmedian sans avertissement sur les colonnes vides (remplacées par default)
+            stat = np.nanmedian(np.where(counts > 0, ratio, 0.0), axis=0)
+        growth = np.where(counts > 0, stat, default)
+    if cap is not None:
+        growth = np.clip(growth, -cap, cap)
+    return growth
+
+def growth_budget(Y, method="mean", window=None, cap=None, default=0.05):
+    # Règle de compute_budget_forecast sur une matrice (T mois, S séries) :
+    # dernier réel * (1 + croissance moyenne sur 12 mois, 5 % si moins de 13 mois)
+    Y = np.asarray(Y, dtype=float)
+    return Y[-1] * (1 + growth_rates(Y, method, window, cap, default))
+
+def budget_table(df, dim="Plant", method="mean", window=None, cap=None, default=0.05):
+    # Budget du mois suivant pour chaque membre de dim (Plant, Cost Center, Functional Area...)
+    wide = monthly_matrix(df, dim)
+    if wide.empty:
+        return pd.DataFrame(columns=[dim, "Period", "Last", "Growth", "Budget"])
+    Y = wide.to_numpy()
+    growth = growth_rates(Y, method, window, cap, default)
+    return pd.DataFrame({
+        dim: wide.columns,
+        "Period": wide.index[-1] + pd.offsets.MonthBegin(),
+        "Last": Y[-1],
+        "Growth": growth,
+        "Budget": Y[-1] * (1 + growth),
+    })
+
+def budget_forecast_by(df, dim="Plant", total="Toutes"):
+    # {membre: (dfB, dfF)} pour chaque valeur de dim, plus total = tout le jeu
+    # (dim en liste : une entrée par tranche de slice_matrix, clés = tuples).
+    # Même règle que compute_budget_forecast : budget = dernier réel * (1 + croissance
+    # moyenne sur 12 mois, 5 % si moins de 13 mois), forecast = lissage exponentiel 1 mois,
+    # variante choisie par série (model_selection, ajustements répartis entre processus).
+    # Import local : model_selection dépend de ce module
+    from model_selection import forecast_ets
+
+    wide = slice_matrix(df, dim, total)
+    if len(wide) < 2:
+        return {total if isinstance(dim, str) else (total,) * len(dim): empty_budget_forecast()}
+    Y = wide.to_numpy()
+    budget_next = growth_budget(Y)
+    forecast_next = forecast_ets(wide, _state_name(dim, wide, "ets"), 1).to_numpy()[0]
+    return {
+        member: _budget_frames(wide.index, Y[:, j], budget_next[j], forecast_next[j])
+        for j, member in enumerate(wide.columns)
+    }
+
+# --- Prévision multi-horizon avec intervalles par simulation ---
+# Les trajectoires sont tirées en un seul tableau (trajectoires, horizon, séries) ;
+# seule la récursion sur l'horizon est une boucle.
+SIM_PATHS = 1000
+SIM_CHUNK = 256
+_INTERVALS = OrderedDict()
+_INTERVALS_LOCK = threading.Lock()
+MAX_INTERVALS = 64
+
+def simulate_paths(fit, sigma, horizon, n_paths=SIM_PATHS, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (n_paths, len(sigma))
+    level = np.broadcast_to(fit["level"], shape).copy()
+    trend = np.broadcast_to(fit["trend"], shape).copy()
+    paths = np.empty((n_paths, horizon, len(sigma)))
+    for h in range(horizon):
+        err = rng.standard_normal(shape) * sigma
+        paths[:, h] = level + trend + err
+        level += trend + fit["alpha"] * err
+        trend += fit["alpha"] * fit["beta"] * err
+    return paths
+
+def forecast_intervals(wide, horizon=12, level=0.9, n_paths=SIM_PATHS, fit=None):
+    # Forecast point + bornes [Lower, Upper] au niveau demandé, par série et par mois futur.
+    # Mis en cache par (contenu des séries, horizon, niveau, nb de trajectoires).
+    columns = list(wide.columns)
+    key = (
+        hashlib.sha256(wide.to_numpy(dtype=float).tobytes() + repr(columns).encode()).hexdigest(),
+        horizon, level, n_paths,
+    )
+    with _INTERVALS_LOCK:
+        if key in _INTERVALS:
+            _INTERVALS.move_to_end(key)
+            return _INTERVALS[key]
+    dim = wide.columns.name or "Series"
+    Y = wide.to_numpy(dtype=float)
+    fit = fit or fit_holt_batch(Y)
+    sigma = np.sqrt(fit["sse"] / max(len(Y) - 1, 1))
+    point = holt_forecast(fit, horizon)
+    lower = np.empty_like(point)
+    upper = np.empty_like(point)
+    q = [(1 - level) / 2, (1 + level) / 2]
+    for start in range(0, len(columns), SIM_CHUNK):
+        cols = slice(start, start + SIM_CHUNK)
+        part = {k: v[cols] for k, v in fit.items()}
+        paths = simulate_paths(part, sigma[cols], horizon, n_paths, seed=start)
+        lower[:, cols], upper[:, cols] = np.quantile(paths, q, axis=0)
+    periods = pd.date_range(wide.index[-1], periods=horizon + 1, freq="MS")[1:]
+    out = pd.DataFrame({
+        dim: np.tile(columns, horizon),
+        "Period": np.repeat(periods, len(columns)),
+        "Forecast": point.ravel(),
+        "Lower": lower.ravel(),
+        "Upper": upper.ravel(),
+    })
+    with _INTERVALS_LOCK:
+        _INTERVALS[key] = out
+        while len(_INTERVALS) > MAX_INTERVALS:
+            _INTERVALS.popitem(last=False)
+    return out
+
+def forecast_bands_by(df, dim="Plant", total="Toutes", horizon=18, level=0.9):
+    # {membre: DataFrame Period, Forecast, Lower, Upper} sur horizon mois
+    wide = slice_matrix(df, dim, total)
+    if len(wide) < 2:
+        return {}
+    fit = refresh_holt(wide, _state_name(dim, wide))
+    # Membres remplacés par leur position : ils peuvent être des tuples (dim en liste)
+    members = list(wide.columns)
+    wide.columns = pd.RangeIndex(len(members), name="Member")
+    fc = forecast_intervals(wide, horizon, level, fit=fit)
+    return {
+        members[position]: group.drop(columns="Member").reset_index(drop=True)
+        for position, group in fc.groupby("Member", sort=False)
+    }
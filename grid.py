@@ -0,0 +1,30 @@
+import numpy as np
+
+# --- Grille de détail paginée côté serveur ---
+# Pour chaque colonne triable, la permutation triée de tout le jeu est calculée une fois.
+# L'ordre d'une tranche (sélection courante) s'en déduit sans tri : on parcourt la
+# permutation en gardant les lignes du masque, puis seule la page visible est extraite.
+DETAIL_COLUMNS = ["Order", "Vendor", "Material", "Account Number", "Year", "Month", "Cost"]
+PAGE_SIZE = 100
+
+def sort_permutation(df, column, ascending=True):
+    # Positions (iloc) de toutes les lignes triées sur column ; valeurs manquantes à la fin
+    values = df[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+def slice_order(permutation, mask):
+    # Ordre des lignes retenues par mask, en O(lignes) : pas de tri par tranche
+    return permutation[mask[permutation]]
+
+def grid_page(df, order, page, size=PAGE_SIZE, columns=DETAIL_COLUMNS):
+    # Seules les lignes de la page sont lues et envoyées au navigateur
+    rows = order[page * size:(page + 1) * size]
+    columns = [column for column in columns if column in df.columns]
+    return df.iloc[rows][columns]
+
+def detail_valid(df, columns=DETAIL_COLUMNS):
+    # Lignes affichables : comme dropna(how="all", subset=["Order", "Cost"])
+    subset = [column for column in ("Order", "Cost") if column in df.columns and column in columns]
+    if not subset:
+        return np.ones(len(df), dtype=bool)
+    return df[subset].notna().any(axis=1).to_numpy()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from forecast import fit_holt_batch, holt_forecast
+
+# --- Prévision hiérarchique Région → Pays → Usine → Functional Area ---
+# Les séries du niveau le plus fin sont ajustées en bloc (Holt batch), puis tous les
+# niveaux sont obtenus par une seule multiplication par la matrice de sommation S
+# (noeuds x séries fines) : les totaux restent cohérents par construction.
+HIERARCHY = ["Business Area", "Controlling Area", "Plant", "Functional Area"]
+
+def bottom_matrix(df, levels=HIERARCHY):
+    # Mois x séries fines ; colonnes = MultiIndex des niveaux (valeurs manquantes comprises)
+    levels = [level for level in levels if level in df.columns]
+    period = df["Posting Date"].dt.to_period("M")
+    wide = (
+        df
+        .groupby([period] + [df[level] for level in levels], observed=True, dropna=False)["Cost"]
+        .sum()
+        .unstack(levels, fill_value=0.0)
+    )
+    wide = wide[wide.index.notna()]
+    if wide.empty:
+        return wide
+    if not isinstance(wide.columns, pd.MultiIndex):
+        wide.columns = pd.MultiIndex.from_arrays([wide.columns], names=levels)
+    full = pd.period_range(wide.index.min(), wide.index.max(), freq="M")
+    wide = wide.reindex(full, fill_value=0.0)
+    wide.index = wide.index.to_timestamp()
+    return wide.astype(float)
+
+def summing_matrix(columns):
+    # columns : MultiIndex des séries fines. Renvoie (S creuse, noeuds) où la ligne i de S
+    # somme les séries fines du noeud i ; noeuds = Level + une colonne par niveau.
+    names = list(columns.names)
+    rows, cols, blocks = [], [], []
+    offset = 0
+    for depth in range(len(names) + 1):
+        if depth == 0:
+            codes = np.zeros(len(columns), dtype=np.int64)
+            uniques = pd.DataFrame(index=[0], columns=names)
+        else:
+            prefix = columns.droplevel(names[depth:]) if depth < len(names) else columns
+            codes, labels = pd.factorize(prefix)
+            labels = pd.MultiIndex.from_tuples(
+                [label if isinstance(label, tuple) else (label,) for label in labels],
+                names=names[:depth],
+            )
+            uniques = labels.to_frame(index=False).reindex(columns=names)
+        uniques.insert(0, "Level", "Total" if depth == 0 else names[depth - 1])
+        rows.append(codes + offset)
+        cols.append(np.arange(len(columns)))
+        blocks.append(uniques)
+        offset += len(uniques)
+    S = sparse.csr_matrix(
+        (np.ones(sum(len(r) for r in rows)), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(offset, len(columns)),
+    )
+    return S, pd.concat(blocks, ignore_index=True)
+
+def reconcile(S, forecasts, method="bottom_up"):
+    # forecasts : (horizon, séries fines) pour bottom_up, (horizon, noeuds) pour ols.
+    # Renvoie (horizon, noeuds) cohérent avec S.
+    if method == "bottom_up":
+        return (S @ forecasts.T).T
+    if method == "ols":
+        # Projection moindres carrés : S (S'S)^-1 S' y
+        StS = (S.T @ S).tocsc()
+        bottom = spsolve(StS, S.T @ forecasts.T)
+        return (S @ bottom.reshape(S.shape[1], -1)).T
+    raise ValueError(f"Méthode de réconciliation inconnue : {method}")
+
+def hierarchical_forecast(df, levels=HIERARCHY, horizon=12, method="bottom_up"):
+    # DataFrame long : Level, un champ par niveau, Period, Forecast — un noeud par ligne et par mois
+    wide = bottom_matrix(df, levels)
+    if len(wide) < 2:
+        return pd.DataFrame(columns=["Level"] + list(levels) + ["Period", "Forecast"])
+    S, nodes = summing_matrix(wide.columns)
+    Y = wide.to_numpy()
+    if method == "ols":
+        # Tous les noeuds ajustés en un seul lot, puis rendus cohérents
+        Y = (S @ Y.T).T
+    fc = reconcile(S, holt_forecast(fit_holt_batch(Y), horizon), method)
+    periods = pd.date_range(wide.index[-1], periods=horizon + 1, freq="MS")[1:]
+    out = nodes.loc[np.tile(np.arange(len(nodes)), horizon)].reset_index(drop=True)
+    out["Period"] = np.repeat(periods, len(nodes))
+    out["Forecast"] = np.asarray(fc).ravel()
+    return out.reindex(columns=["Level"] + list(levels) + ["Period", "Forecast"])
@@ -0,0 +1,160 @@
+import os
+import pickle
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+from forecast import REFIT_EVERY
+from util import CACHE_DIR
+
+# --- Choix automatique du lissage exponentiel, série par série ---
+# Spec = (tendance, amortie, saison) ; la saison 12 mois n'est essayée qu'à partir
+# de deux cycles complets. Le critère est l'AICc ; la spec gagnante est conservée
+# avec l'historique sur lequel elle a été choisie, et réutilisée tant que ces mois
+# sont inchangés et que l'historique n'a pas grandi de REFIT_EVERY mois.
+SPECS = [
+    (None, False, None),
+    ("add", False, None),
+    ("add", True, None),
+    (None, False, "add"),
+    ("add", False, "add"),
+    ("add", True, "add"),
+]
+SEASONAL_MIN = 24
+# En dessous, les ajustements tournent dans le processus : démarrer des processus
+# coûterait plus que les quelques ajustements (ex. la seule série "Total")
+MIN_PARALLEL_TASKS = 48
+
+def candidate_specs(n_months):
+    return [spec for spec in SPECS if spec[2] is None or n_months >= SEASONAL_MIN]
+
+def _fit(ts, spec):
+    trend, damped, seasonal = spec
+    model = ExponentialSmoothing(
+        ts,
+        trend=trend,
+        damped_trend=damped,
+        seasonal=seasonal,
+        seasonal_periods=12 if seasonal else None,
+        initialization_method="estimated",
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return model.fit()
+
+def _fit_forecast(ts, spec, horizon):
+    # (AICc, prévision sur horizon) de la spec ; (inf, None) si l'ajustement échoue
+    # (la spec est alors écartée). La prévision du gagnant est reprise telle quelle.
+    try:
+        fit = _fit(ts, spec)
+        aicc, fc = fit.aicc, fit.forecast(horizon).to_numpy()
+    except Exception:
+        return np.inf, None
+    if not (np.isfinite(aicc) and np.isfinite(fc).all()):
+        return np.inf, None
+    return aicc, fc
+
+def _monthly(wide, j):
+    return pd.Series(
+        wide.iloc[:, j].to_numpy(dtype=float),
+        index=pd.date_range(wide.index[0], periods=len(wide), freq="MS"),
+    )
+
+def select_specs(wide, candidates, horizon=1, workers=None):
+    # candidates : {position de colonne: specs à essayer}. Renvoie {position: (spec, prévision)}
+    # pour la meilleure spec de chaque série ; les séries sans spec ajustable sont absentes.
+    # Chaque couple (série, spec) est un ajustement indépendant, réparti entre processus.
+    tasks = [(j, spec) for j, specs in candidates.items() for spec in specs]
+    if not tasks:
+        return {}
+    series = [_monthly(wide, j) for j, _ in tasks]
+    specs = [spec for _, spec in tasks]
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    results = None
+    if workers > 1 and len(tasks) >= MIN_PARALLEL_TASKS:
+        # spawn : appelé depuis un thread du serveur Streamlit, un fork pourrait se bloquer
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                results = list(pool.map(_fit_forecast, series, specs, [horizon] * len(tasks), chunksize=chunksize))
+        except (BrokenProcessPool, OSError):
+            results = None
+    if results is None:
+        results = [_fit_forecast(ts, spec, horizon) for ts, spec in zip(series, specs)]
+    best = {}
+    for (j, spec), (aicc, fc) in zip(tasks, results):
+        if fc is not None and aicc < best.get(j, (None, np.inf, None))[1]:
+            best[j] = (spec, aicc, fc)
+    return {j: (spec, fc) for j, (spec, _, fc) in best.items()}
+
+def _specs_path(name):
+    return CACHE_DIR / f"{name}.pkl"
+
+def _load_specs(name):
+    path = _specs_path(name)
+    if path.exists():
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+    return {}
+
+def _save_specs(name, specs):
+    path = _specs_path(name)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(specs, fh)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _stale(entry, values):
+    # Nouvelle recherche si la spec est absente, si les mois déjà vus ont changé (autre jeu
+    # de données, écritures tardives), si l'historique a trop grandi ou si la saison devient possible
+    history = entry.get("history") if entry else None
+    if history is None:
+        return True
+    known, n_months = len(history), len(values)
+    return (
+        not known <= n_months < known + REFIT_EVERY
+        or (known >= SEASONAL_MIN) != (n_months >= SEASONAL_MIN)
+        or not np.allclose(values[:known], history, rtol=1e-9, atol=1e-6)
+    )
+
+def forecast_ets(wide, name, horizon=1, workers=None):
+    # wide : matrice mois x séries, mois continus (monthly_matrix / slice_matrix).
+    # Prévision (horizon x séries) avec la spec choisie pour chaque série ;
+    # repli sur le dernier réel si aucune spec ne s'ajuste. Recherches et specs
+    # déjà connues sont ajustées dans le même lot.
+    n = len(wide)
+    periods = pd.date_range(wide.index[-1], periods=horizon + 1, freq="MS")[1:]
+    Y = wide.to_numpy(dtype=float)
+    out = pd.DataFrame(np.repeat(Y[-1:], horizon, axis=0), index=periods, columns=wide.columns)
+    if n < 2:
+        return out
+    specs = _load_specs(name)
+    columns = list(wide.columns)
+    search = [j for j, column in enumerate(columns) if _stale(specs.get(column), Y[:, j])]
+    candidates = {j: candidate_specs(n) for j in search}
+    known = [j for j in range(len(columns)) if j not in candidates and specs[columns[j]]["spec"] is not None]
+    candidates.update({j: [specs[columns[j]]["spec"]] for j in known})
+    best = select_specs(wide, candidates, horizon, workers)
+    for j in search:
+        specs[columns[j]] = {"spec": best[j][0] if j in best else None, "history": Y[:, j].copy()}
+    for j in known:
+        if j not in best:
+            # La spec retenue n'ajuste plus : on garde le repli et on relancera la recherche
+            specs.pop(columns[j])
+    for j, (_, fc) in best.items():
+        out.iloc[:, j] = fc
+    _save_specs(name, specs)
+    return out
@@ -4,6 +4,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
+import util
+from forecast import submit_background, background_result, empty_budget_forecast
 
 # --- Page Config ---
 st.set_page_config(page_title="Maintenance Cost Dashboard", layout="wide")
@@ -21,21 +23,12 @@ if not uploaded_data:
 
 @st.cache_data(ttl=3600)
 def load_real_data(files):
-    dfs = []
-    for f in files:
-        df = pd.read_excel(f, sheet_name="Sheet1", engine="openpyxl")
-        dfs.append(df)
-    df_all = pd.concat(dfs, ignore_index=True)
-    df_all["Posting Date"] = pd.to_datetime(df_all["Posting Date"])
-    df_all["Year"]  = df_all["Posting Date"].dt.year
-    df_all["Month"] = df_all["Posting Date"].dt.month
-    df_all["Cost"]  = df_all["In profit center local currency"].fillna(0)
-    return df_all
+    # Lecture mise en cache sur disque (Parquet) par util.load_real_data
+    return util.load_real_data(files)
 
 df = load_real_data(uploaded_data)
 
 # --- Calcul automatique Budget & Forecast ---
-@st.cache_data(ttl=3600)
 def compute_budget_forecast(df):
     ts = (
         df
@@ -73,7 +66,18 @@ def compute_budget_forecast(df):
         dfx["Month"] = dfx["Period"].dt.month
     return dfB, dfF
 
-dfB, dfF = compute_budget_forecast(df)
+# --- Budget & Forecast calculés en arrière-plan (clé = empreinte du jeu de données) ---
+# La page s'affiche tout de suite ; les courbes sont complétées quand le modèle a fini.
+forecast_job = submit_background(("budget_forecast_total", util.dataset_fingerprint(df)), compute_budget_forecast, df)
+dfB, dfF = (frame.astype({"Period": "datetime64[ns]"}) for frame in empty_budget_forecast())
+forecast_ready = forecast_job.done()
+if forecast_ready:
+    try:
+        dfB, dfF = background_result(forecast_job)
+    except Exception as e:
+        st.warning(f"Budget & Forecast indisponibles : {e}")
+else:
+    st.info("⏳ Budget et Forecast en cours de calcul, le graphique sera complété automatiquement.")
 
 # --- Filtres ---
 st.sidebar.title("Filtres")
@@ -121,7 +125,7 @@ with tabs[0]:
 
 with tabs[1]:
     st.header("Total Cost & Benchmark")
-    agg = df_filt.groupby("Plant")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Plant", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Plant", y="Cost", labels={"Cost":"Coût total"}), use_container_width=True)
 
 with tabs[2]:
@@ -139,22 +143,22 @@ with tabs[2]:
 
 with tabs[3]:
     st.header("Cost at Functional Location")
-    agg = df_filt.groupby("Functional Area")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Functional Area", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Functional Area", y="Cost"), use_container_width=True)
 
 with tabs[4]:
     st.header("Cost at Equipment")
-    agg = df_filt.groupby("Equipment")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Equipment", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Equipment", y="Cost"), use_container_width=True)
 
 with tabs[5]:
     st.header("Cost at Vendor")
-    agg = df_filt.groupby("Vendor")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Vendor", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Vendor", y="Cost"), use_container_width=True)
 
 with tabs[6]:
     st.header("Cost at Material")
-    agg = df_filt.groupby("Material")["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
+    agg = df_filt.groupby("Material", observed=True)["Cost"].sum().reset_index().sort_values("Cost", ascending=False)
     st.plotly_chart(px.bar(agg, x="Material", y="Cost"), use_container_width=True)
 
 with tabs[7]:
@@ -175,3 +179,14 @@ with tabs[8]:
         px.bar(agg, x="Stop ID", y="Cost", hover_data=["Stop Cause"]),
         use_container_width=True
     )
+
+# --- Calculs encore en cours : la page reste utilisable pendant l'ajustement ;
+# un fragment vérifie les calculs toutes les 2 s et relance la page quand ils sont prêts ---
+@st.fragment(run_every=2)
+def background_status(jobs):
+    if all(job.done() for job in jobs):
+        st.rerun()
+    st.caption("⏳ Calculs en arrière-plan en cours…")
+
+if not forecast_ready:
+    background_status([forecast_job])
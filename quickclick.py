@@ -14,6 +14,7 @@
     "import plotly.express as px\n",
     "from pathlib import Path\n",
     "from statsmodels.tsa.holtwinters import ExponentialSmoothing\n",
+    "import util\n",
     "\n",
     "# 1. Upload des fichiers\n",
     "st.sidebar.title(\"Chargement des fichiers\")\n",
@@ -29,21 +30,12 @@
     "\n",
     "@st.cache_data(ttl=3600)\n",
     "def load_real_data(files):\n",
-    "    dfs = []\n",
-    "    for f in files:\n",
-    "        df = pd.read_excel(f, sheet_name=\"Sheet1\", engine=\"openpyxl\")\n",
-    "        dfs.append(df)\n",
-    "    df_all = pd.concat(dfs, ignore_index=True)\n",
-    "    df_all[\"Posting Date\"] = pd.to_datetime(df_all[\"Posting Date\"])\n",
-    "    df_all[\"Year\"]  = df_all[\"Posting Date\"].dt.year\n",
-    "    df_all[\"Month\"] = df_all[\"Posting Date\"].dt.month\n",
-    "    df_all[\"Cost\"]  = df_all[\"In profit center local currency\"].fillna(0)\n",
-    "    return df_all\n",
+    "    # Lecture mise en cache sur disque (Parquet) par util.load_real_data\n",
+    "    return util.load_real_data(files)\n",
     "\n",
     "df = load_real_data(uploaded_data)\n",
     "\n",
     "# 2. Calcul Budget et Forecast automatiques\n",
-    "@st.cache_data(ttl=3600)\n",
     "def compute_budget_forecast(df):\n",
     "    # 2.1 Agrégation mensuelle globale\n",
     "    series = (\n",
@@ -86,7 +78,12 @@
     "        dfX[\"Month\"] = dfX[\"Period\"].dt.month\n",
     "    return dfB, dfF\n",
     "\n",
-    "dfB, dfF = compute_budget_forecast(df)\n",
+    "@st.cache_data(ttl=3600)\n",
+    "def load_budget_forecast(_df, fingerprint):\n",
+    "    # Clé de cache = empreinte du jeu de données, pas un hachage du DataFrame entier\n",
+    "    return compute_budget_forecast(_df)\n",
+    "\n",
+    "dfB, dfF = load_budget_forecast(df, util.dataset_fingerprint(df))\n",
     "\n",
     "# 3. Sidebar – Filtres\n",
     "st.sidebar.title(\"Filtres\")\n",
@@ -135,7 +132,7 @@
     "# 4.2 Total & Benchmark\n",
     "with tabs[1]:\n",
     "    st.header(\"Total Cost & Benchmark\")\n",
-    "    agg = df_filt.groupby(\"Plant\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Plant\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Plant\", y=\"Cost\", labels={\"Cost\":\"Coût total\"}), use_container_width=True)\n",
     "\n",
     "# 4.3 Cost without PM order\n",
@@ -149,25 +146,25 @@
     "# 4.4 Cost at Functional Location\n",
     "with tabs[3]:\n",
     "    st.header(\"Cost at Functional Location\")\n",
-    "    agg = df_filt.groupby(\"Functional Area\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Functional Area\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Functional Area\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "# 4.5 Cost at Equipment\n",
     "with tabs[4]:\n",
     "    st.header(\"Cost at Equipment\")\n",
-    "    agg = df_filt.groupby(\"Equipment\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Equipment\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Equipment\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "# 4.6 Cost at Vendor\n",
     "with tabs[5]:\n",
     "    st.header(\"Cost at Vendor\")\n",
-    "    agg = df_filt.groupby(\"Vendor\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Vendor\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Vendor\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "# 4.7 Cost at Material\n",
     "with tabs[6]:\n",
     "    st.header(\"Cost at Material\")\n",
-    "    agg = df_filt.groupby(\"Material\")[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
+    "    agg = df_filt.groupby(\"Material\", observed=True)[\"Cost\"].sum().reset_index().sort_values(\"Cost\", ascending=False)\n",
     "    st.plotly_chart(px.bar(agg, x=\"Material\", y=\"Cost\"), use_container_width=True)\n",
     "\n",
     "# 4.8 Cost at Order\n",
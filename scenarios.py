@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from forecast import growth_budget, monthly_matrix
+
+# --- Simulation what-if du budget (Monte Carlo) ---
+# Un choc = facteur multiplicatif incertain appliqué aux coûts mensuels d'un membre
+# (ex. Material "WEAR PART" +8 %, Vendor X remplacé -10 %). Les chocs portent sur la
+# matrice mensuelle des cellules Vendor x Material x Plant ; le budget est ensuite
+# évalué au niveau de by (Plant) avec la même règle que budget_table, donc un scénario
+# sans choc redonne exactement la table de budget.
+# Seules les cellules choquées sont regroupées, par (motif de chocs, membre de by) :
+# le coût d'un lot de scénarios ne dépend pas du nombre de cellules.
+SHOCK_FIELDS = ["Vendor", "Material", "Plant"]
+N_SCENARIOS = 5000
+PERCENTILES = (5, 50, 95)
+# Taille d'un lot de scénarios en valeurs (scénarios x mois x membres)
+SIM_BLOCK = 2_000_000
+
+def scenario_base(df, fields=SHOCK_FIELDS, by="Plant"):
+    # {"wide": mois x membres de by (comme budget_table), "cells": champs de chaque cellule
+    # observée, "Y": mois x cellules sur les mêmes mois, "member": colonne de wide par cellule}
+    fields = [field for field in fields if field in df.columns]
+    wide = monthly_matrix(df, by) if by in df.columns else monthly_matrix(df)
+    if wide.empty:
+        return {"wide": wide, "cells": pd.DataFrame(columns=fields), "Y": np.zeros((0, 0)), "member": np.zeros(0, dtype=int)}
+    period = df["Posting Date"].dt.to_period("M")
+    cell_wide = (
+        df
+        .groupby([period] + [df[field] for field in fields], observed=True, dropna=False)["Cost"]
+        .sum()
+        .unstack(fields, fill_value=0.0)
+    )
+    cell_wide = cell_wide[cell_wide.index.notna()]
+    cell_wide.index = cell_wide.index.to_timestamp()
+    cell_wide = cell_wide.reindex(wide.index, fill_value=0.0)
+    cells = cell_wide.columns.to_frame(index=False)
+    if by in cells.columns:
+        # -1 : cellule sans membre de by (ex. usine manquante), absente de budget_table
+        member = wide.columns.get_indexer(cells[by])
+    else:
+        member = np.zeros(len(cells), dtype=int)
+    return {"wide": wide, "cells": cells, "Y": cell_wide.to_numpy(dtype=float), "member": member}
+
+def _shock_masks(cells, shocks):
+    # (chocs, cellules) booléen : la cellule appartient-elle au membre choqué ?
+    masks = np.zeros((len(shocks), len(cells)), dtype=bool)
+    for i, shock in enumerate(shocks):
+        if shock["field"] in cells.columns:
+            masks[i] = (cells[shock["field"]].astype(str) == str(shock["value"])).to_numpy()
+    return masks
+
+def simulate_budget(base, shocks, n_scenarios=N_SCENARIOS, percentiles=PERCENTILES, seed=0, **rule):
+    # shocks : [{"field", "value", "factor", "sd"}] ; factor = effet moyen (1.08 = +8 %),
+    # sd = incertitude relative (0 = choc certain) ; rule : voir growth_rates.
+    # Renvoie une ligne par membre de by plus "Total" : Base, Mean et un percentile
+    # par colonne (P5, P50, P95...).
+    wide = base["wide"]
+    by = wide.columns.name or "Total"
+    members = list(wide.columns)
+    if wide.empty:
+        return pd.DataFrame(columns=[by, "Base", "Mean"] + [f"P{p}" for p in percentiles])
+    X = wide.to_numpy(dtype=float)
+    budget = growth_budget(X, **rule)
+    # Cellules choquées regroupées par (motif de chocs, membre de by) : W (mois, motifs, membres)
+    masks = _shock_masks(base["cells"], shocks)
+    hit = masks.any(axis=0) & (base["member"] >= 0)
+    patterns, pattern_codes = np.unique(masks[:, hit].T, axis=0, return_inverse=True)
+    W = np.zeros((len(X), len(patterns), len(members)))
+    np.add.at(W, (slice(None), pattern_codes.ravel(), base["member"][hit]), base["Y"][:, hit])
+    # Facteurs log-normaux de moyenne factor et d'écart-type relatif sd, tirés en un seul tableau
+    factor = np.array([shock["factor"] for shock in shocks], dtype=float).reshape(1, -1)
+    sd = np.array([shock.get("sd", 0.0) for shock in shocks], dtype=float).reshape(1, -1)
+    sigma = np.sqrt(np.log1p(sd ** 2))
+    rng = np.random.default_rng(seed)
+    log_factors = np.log(factor) - sigma ** 2 / 2 + sigma * rng.standard_normal((n_scenarios, len(shocks)))
+    # Écart au réel par motif : 0 sans choc, donc le scénario redonne X exactement
+    delta = np.exp(log_factors @ patterns.T.astype(float)) - 1
+    outcomes = np.empty((n_scenarios, len(members)))
+    block = max(1, SIM_BLOCK // max(X.size, 1))
+    for start in range(0, n_scenarios, block):
+        stop = min(start + block, n_scenarios)
+        # Matrices mensuelles choquées (scénarios, mois, membres), puis règle de budget
+        # appliquée à toutes les séries du lot d'un coup
+        Z = X + np.einsum("sp,tpg->stg", delta[start:stop], W)
+        Z = Z.transpose(1, 0, 2).reshape(len(X), -1)
+        outcomes[start:stop] = growth_budget(Z, **rule).reshape(stop - start, len(members))
+    outcomes = np.column_stack([outcomes, outcomes.sum(axis=1)])
+    out = pd.DataFrame({by: members + ["Total"]})
+    out["Base"] = np.append(budget, budget.sum())
+    out["Mean"] = outcomes.mean(axis=0)
+    for p, values in zip(percentiles, np.percentile(outcomes, percentiles, axis=0)):
+        out[f"P{p}"] = values
+    return out
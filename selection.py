@@ -0,0 +1,174 @@
+import bisect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# --- Index bitmap des sélections ---
+# Pour chaque champ filtrable et chaque valeur : un bitmap des lignes concernées,
+# compacté 64 lignes par mot. Une combinaison de filtres = quelques ET mot à mot.
+SELECTION_FIELDS = ["Year", "Month", "Business Area", "Controlling Area", "Plant"]
+
+# Champs de la sidebar Q4/Q5 pour la logique associative (valeurs possibles / exclues)
+ASSOCIATIVE_FIELDS = SELECTION_FIELDS + [
+    "Document Type", "Curr. Key of CoCd Curr.", "Profit Center", "Functional Area",
+    "Cost Center", "Ref. Document", "Order", "WBS Element", "User Name",
+]
+
+# Au-delà, le bitmap d'une valeur est calculé à la demande depuis les codes
+BITMAP_MAX_VALUES = 256
+
+def _pack(mask, words):
+    bits = np.zeros(words * 8, dtype=np.uint8)
+    packed = np.packbits(mask)
+    bits[:len(packed)] = packed
+    return bits.view(np.uint64)
+
+def _unpack(bits, rows):
+    return np.unpackbits(bits.view(np.uint8), count=rows).astype(bool)
+
+def build_bitmap_index(df, fields=ASSOCIATIVE_FIELDS):
+    n = len(df)
+    words = (n + 63) // 64
+    index = {"rows": n, "words": words, "fields": {}}
+    for field in fields:
+        if field not in df.columns:
+            continue
+        # Codes triés : les valeurs possibles sortent déjà dans l'ordre des listes
+        codes, uniques = pd.factorize(df[field], sort=True)
+        codes = codes.astype(np.int32)
+        entry = {
+            "codes": codes,
+            "values": list(uniques),
+            "lookup": {value: k for k, value in enumerate(uniques)},
+            "bitmaps": None,
+        }
+        if len(uniques) <= BITMAP_MAX_VALUES:
+            entry["bitmaps"] = [_pack(codes == k, words) for k in range(len(uniques))]
+        index["fields"][field] = entry
+    return index
+
+def _value_bits(index, field, value):
+    entry = index["fields"].get(field)
+    if entry is None:
+        raise KeyError(f"Champ non indexé : {field}")
+    k = entry["lookup"].get(value)
+    if k is None:
+        return None
+    if entry["bitmaps"] is not None:
+        return entry["bitmaps"][k]
+    return _pack(entry["codes"] == k, index["words"])
+
+def select_bits(index, selections):
+    # selections : {champ: valeur} ; un champ absent ne filtre pas
+    bits = None
+    for field, value in selections.items():
+        b = _value_bits(index, field, value)
+        if b is None:
+            return np.zeros(index["words"], dtype=np.uint64)
+        bits = b.copy() if bits is None else np.bitwise_and(bits, b, out=bits)
+    if bits is None:
+        bits = _pack(np.ones(index["rows"], dtype=bool), index["words"])
+    return bits
+
+def select_mask(index, selections):
+    # Masque booléen des lignes retenues (une entrée par ligne du DataFrame)
+    return _unpack(select_bits(index, selections), index["rows"])
+
+def select_rows(index, selections):
+    # Positions (iloc) des lignes retenues, dans l'ordre du DataFrame
+    return np.flatnonzero(select_mask(index, selections))
+
+# --- Moteur associatif ---
+def _possible_codes(index, selections, field, masks):
+    # Masque booléen sur le domaine du champ ; None = aucune autre sélection (tout possible)
+    others = tuple(sorted(k for k in selections if k != field))
+    if not others:
+        return None
+    if others not in masks:
+        bits = select_bits(index, {k: selections[k] for k in others})
+        masks[others] = _unpack(bits, index["rows"])
+    entry = index["fields"][field]
+    codes = entry["codes"][masks[others]]
+    present = np.zeros(len(entry["values"]), dtype=bool)
+    present[codes[codes >= 0]] = True
+    return present
+
+def possible_codes(index, selections, field):
+    return _possible_codes(index, selections, field, {})
+
+def field_states(index, selections, fields=None):
+    # {champ: (valeurs possibles, valeurs exclues)} compte tenu des sélections des *autres*
+    # champs (comme QlikView : un champ sélectionné garde ses alternatives visibles).
+    # Un seul passage : les masques des combinaisons de sélections sont partagés.
+    fields = [f for f in (fields or index["fields"]) if f in index["fields"]]
+    masks = {}
+    out = {}
+    for field in fields:
+        values = index["fields"][field]["values"]
+        present = _possible_codes(index, selections, field, masks)
+        if present is None:
+            # Aucune autre sélection : toutes les valeurs du domaine, déjà triées
+            out[field] = (values, [])
+        else:
+            out[field] = (
+                [v for v, keep in zip(values, present) if keep],
+                [v for v, keep in zip(values, present) if not keep],
+            )
+    return out
+
+def possible_values(index, selections, fields=None):
+    # Valeurs possibles seulement ; les exclues sont données par field_states
+    return {field: possible for field, (possible, _) in field_states(index, selections, fields).items()}
+
+# --- Recherche dans les champs à forte cardinalité ---
+# Seules les meilleures correspondances partent vers le navigateur, page par page.
+SEARCH_FIELDS = ["Order", "Ref. Document", "WBS Element"]
+SEARCH_LIMIT = 50
+
+def build_search_index(values):
+    # values : domaine trié du champ (index["fields"][champ]["values"])
+    keys = [str(v).lower() for v in values]
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    blob = "\n".join(keys)
+    starts = np.cumsum([0] + [len(k) + 1 for k in keys[:-1]]) if keys else np.zeros(0, dtype=int)
+    return {
+        "values": values,
+        "keys": keys,
+        "sorted_keys": [keys[i] for i in order],
+        "order": order,
+        "blob": blob,
+        "starts": starts,
+    }
+
+def _search_codes(search, text, allowed):
+    # Préfixes d'abord (recherche dichotomique), puis sous-chaînes (balayage du texte concaténé)
+    keys = search["keys"]
+    if not text:
+        for code in range(len(keys)):
+            if allowed is None or allowed[code]:
+                yield code
+        return
+    lo = bisect.bisect_left(search["sorted_keys"], text)
+    for i in range(lo, len(keys)):
+        if not search["sorted_keys"][i].startswith(text):
+            break
+        code = search["order"][i]
+        if allowed is None or allowed[code]:
+            yield code
+    blob, starts = search["blob"], search["starts"]
+    pos = blob.find(text)
+    while pos != -1:
+        code = int(np.searchsorted(starts, pos, side="right")) - 1
+        if pos > starts[code] and (allowed is None or allowed[code]):
+            yield code
+        if code + 1 >= len(keys):
+            break
+        pos = blob.find(text, starts[code + 1])
+
+def search_values(search, text, allowed=None, page=0, limit=SEARCH_LIMIT):
+    # Renvoie (valeurs de la page, il reste des résultats après cette page)
+    text = str(text).strip().lower()
+    start, stop = page * limit, (page + 1) * limit
+    codes = list(itertools.islice(_search_codes(search, text, allowed), start, stop + 1))
+    return [search["values"][c] for c in codes[:limit]], len(codes) > limit
@@ -1,53 +1,333 @@
+import hashlib
+import io
+import os
+import pickle
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._reader import WorkSheetParser
+
+# --- Colonnes utilisées par les dashboards (nom canonique -> en-têtes SAP acceptés) ---
+# Par ordre de priorité : si plusieurs en-têtes d'une même colonne sont présents,
+# le premier de la liste gagne (le nom canonique d'abord).
+COLUMNS = {
+    "Posting Date": ("Posting Date", "Pstng Date", "Posting date"),
+    "In profit center local currency": (
+        "In profit center local currency", "In PrCtr local currency",
+        "Amount in profit center local currency",
+    ),
+    "Plant": ("Plant", "Plnt"),
+    "Functional Area": ("Functional Area", "Functional area", "FArea"),
+    "Equipment": ("Equipment", "Equipment number"),
+    "Vendor": ("Vendor", "Supplier"),
+    "Material": ("Material", "Material number"),
+    "Order": ("Order", "Order number"),
+    "Stop ID": ("Stop ID", "Stop Id", "Stoppage ID"),
+    "Stop Cause": ("Stop Cause", "Stoppage Cause"),
+    "Account Number": ("Account Number", "G/L Account"),
+    "Business Area": ("Business Area", "Bus. Area"),
+    "Controlling Area": ("Controlling Area", "CO Area"),
+    "Document Type": ("Document Type", "Doc. Type"),
+    "Curr. Key of CoCd Curr.": ("Curr. Key of CoCd Curr.", "Company Code Currency"),
+    "Profit Center": ("Profit Center", "Profit Ctr"),
+    "Cost Center": ("Cost Center", "Cost Ctr"),
+    "Ref. Document": ("Ref. Document", "Reference Document"),
+    "WBS Element": ("WBS Element", "WBS element"),
+    "User Name": ("User Name", "User name", "Entered by"),
+}
+
+def _norm(name):
+    # Comparaison tolérante : casse, ponctuation et espaces ignorés
+    return re.sub(r"[^0-9a-z]+", " ", str(name).lower()).strip()
+
+# En-tête normalisé -> (nom canonique, rang de priorité)
+ALIASES = {}
+for col, aliases in COLUMNS.items():
+    for rank, alias in enumerate(aliases):
+        ALIASES.setdefault(_norm(alias), (col, rank))
+
+def _resolve_columns(names):
+    # {en-tête source: nom canonique}, un seul en-tête retenu par colonne canonique
+    best = {}
+    for name in names:
+        match = ALIASES.get(_norm(name))
+        if match is not None and (match[0] not in best or match[1] < best[match[0]][1]):
+            best[match[0]] = (name, match[1])
+    return {name: col for col, (name, _) in best.items()}
+
+# Colonnes de codes et libellés : toujours stockées en texte, quel que soit le type
+# qu'openpyxl a déduit pour un fichier donné (tout le reste est date ou montant)
+CODE_COLUMNS = [col for col in COLUMNS if col not in ("Posting Date", "In profit center local currency")]
+
+# Dimensions encodées en dictionnaire (codes entiers) : groupby et masques sur entiers
+DIMENSIONS = [
+    "Plant", "Vendor", "Material", "Functional Area", "Equipment", "Business Area",
+    "Controlling Area", "Document Type", "Profit Center", "Cost Center", "User Name",
+]
+
+# Champs dont la sidebar affiche la liste triée des valeurs
+DOMAIN_FIELDS = [
+    "Year", "Month", "Business Area", "Controlling Area", "Plant", "Document Type",
+    "Curr. Key of CoCd Curr.", "Profit Center", "Functional Area", "Cost Center",
+    "Ref. Document", "Order", "WBS Element", "User Name",
+]
+
+# --- Cache disque colonnaire (Parquet) des fichiers déjà lus ---
+CACHE_DIR = Path(os.environ.get("MAINTENANCE_CACHE_DIR", ".cache/excel"))
+# Le cache dépend aussi du schéma et du format stocké : un changement de COLUMNS
+# ou de la normalisation des codes (CACHE_FORMAT) invalide les fichiers
+CACHE_FORMAT = 2
+SCHEMA_KEY = hashlib.sha256(repr((CACHE_FORMAT, sorted(COLUMNS.items()))).encode()).hexdigest()[:8]
+
+# Taille maximale du dossier de cache : au-delà, les fichiers les moins récemment
+# utilisés (Parquet, domaines, états de prévision) sont supprimés
+CACHE_MAX_BYTES = int(os.environ.get("MAINTENANCE_CACHE_MAX_MB", "1024")) * 2 ** 20
+# Fichiers temporaires abandonnés (processus interrompu) supprimés après ce délai
+STALE_TMP_SECONDS = 3600
+
+def _touch(path):
+    # Date de dernière utilisation, pour l'éviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _prune_cache(max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    now = time.time()
+    try:
+        paths = list(CACHE_DIR.iterdir())
+    except OSError:
+        return
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if path.suffix == ".tmp":
+            if now - stat.st_mtime > STALE_TMP_SECONDS:
+                path.unlink(missing_ok=True)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+    total = 0
+    for _, size, path in entries:
+        total += size
+        if total > max_bytes:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+def _file_bytes(f):
+    # Accepte un UploadedFile Streamlit, un flux binaire ou un chemin
+    if hasattr(f, "getvalue"):
+        return f.getvalue()
+    if hasattr(f, "read"):
+        f.seek(0)
+        return f.read()
+    return Path(f).read_bytes()
+
+def _code_text(value):
+    # 4000001, 4000001.0 et "4000001" donnent tous "4000001"
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+def _code_strings(values):
+    # Une conversion par valeur distincte ; les valeurs manquantes restent manquantes
+    codes, uniques = pd.factorize(values)
+    texts = np.array([_code_text(value) for value in uniques] + [np.nan], dtype=object)
+    return pd.Series(texts[codes], index=values.index, name=values.name)
+
+def _storable(df):
+    # Parquet refuse les colonnes objet mélangeant nombres et textes (ex. "Order")
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ("mixed", "mixed-integer"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def _cache_path(digest):
+    return CACHE_DIR / f"{digest}-{SCHEMA_KEY}.parquet"
+
+class _ColumnParser(WorkSheetParser):
+    # Lecteur de feuille openpyxl qui retire les cellules des autres colonnes avant
+    # de les décoder : seules les colonnes retenues coûtent une conversion de valeur
+    # (usecols de read_excel ne filtre qu'après avoir converti toute la feuille)
+    def __init__(self, src, shared_strings, letters, **kwargs):
+        super().__init__(src, shared_strings, **kwargs)
+        self.letters = letters
+
+    def parse_row(self, row):
+        for el in list(row):
+            ref = el.get("r")
+            if ref is not None and ref.rstrip("0123456789") not in self.letters:
+                row.remove(el)
+        return super().parse_row(row)
+
+def _read_columns(data, sheet_name="Sheet1"):
+    # Comme read_excel(header=0) limité aux colonnes de COLUMNS, déjà renommées
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        header = next(ws.iter_rows(max_row=1, values_only=True), ())
+        mapping = _resolve_columns([name for name in header if name is not None])
+        positions = {}
+        for i, name in enumerate(header, start=1):
+            if name in mapping and mapping[name] not in positions.values():
+                positions[i] = mapping[name]
+        columns = {col: [] for col in positions.values()}
+        with ws._get_source() as src:
+            parser = _ColumnParser(
+                src, ws._shared_strings, {get_column_letter(i) for i in positions},
+                data_only=True, epoch=wb.epoch,
+                date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats,
+            )
+            for row, cells in parser.parse():
+                values = {cell["column"]: cell["value"] for cell in cells if cell["value"] is not None}
+                # En-tête et lignes vides ignorés, comme read_excel
+                if row == 1 or not values:
+                    continue
+                for i, col in positions.items():
+                    columns[col].append(values.get(i))
+    finally:
+        wb.close()
+    return pd.DataFrame(columns)
+
+def _parse_sheet(data, digest):
+    # Exécuté dans un processus séparé : openpyxl est du Python pur, lié au CPU.
+    # Projection à la lecture : seules les cellules des colonnes de COLUMNS sont décodées
+    df = _read_columns(data)
+    # Même forme canonique des codes dans tous les fichiers (et dans le cache Parquet) :
+    # une colonne lue en float à cause de cellules vides ne doit pas donner "4000001.0"
+    for col in CODE_COLUMNS:
+        if col in df.columns:
+            df[col] = _code_strings(df[col])
+    df = _storable(df)
+    path = _cache_path(digest)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Fichier temporaire propre au thread : la lecture séquentielle tourne sur les
+        # threads du serveur, deux sessions peuvent charger le même fichier en même temps
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except (OSError, ValueError, TypeError, ImportError):
+        # Cache facultatif : on garde le résultat lu même si l'écriture échoue
+        pass
+    return df
+
+def _read_sheets(files, workers=None):
+    datas = [_file_bytes(f) for f in files]
+    digests = [hashlib.sha256(data).hexdigest() for data in datas]
+    dfs = [None] * len(datas)
+    missing = []
+    for i, digest in enumerate(digests):
+        path = _cache_path(digest)
+        if path.exists():
+            try:
+                dfs[i] = pd.read_parquet(path)
+                _touch(path)
+                continue
+            except (OSError, ValueError):
+                # Fichier tronqué ou illisible (ArrowInvalid est une ValueError) : relu depuis l'Excel
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        missing.append(i)
+    workers = min(len(missing), workers or os.cpu_count() or 1)
+    parsed = None
+    if workers > 1:
+        # Un fichier par processus : la durée totale ≈ celle du plus gros fichier.
+        # spawn : le serveur Streamlit est multi-thread, un fork pourrait se bloquer
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                parsed = list(pool.map(
+                    _parse_sheet, [datas[i] for i in missing], [digests[i] for i in missing]
+                ))
+        except (BrokenProcessPool, OSError):
+            parsed = None
+    if parsed is None:
+        parsed = [_parse_sheet(datas[i], digests[i]) for i in missing]
+    for i, df in zip(missing, parsed):
+        dfs[i] = df
+    return dfs, digests
+
+def dataset_fingerprint(df):
+    # Version du jeu de données, à passer en clé aux calculs mis en cache
+    # (le DataFrame lui-même est passé en argument "_df", non haché par Streamlit).
+    # Les attrs se propagent aux sous-ensembles : pour un df filtré, ajouter la sélection à la clé.
+    fingerprint = df.attrs.get("fingerprint")
+    if fingerprint is None:
+        # Jeu construit hors load_real_data : repli sur un hachage du contenu
+        hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        fingerprint = hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+    return fingerprint
 
 # --- Chargement des fichiers Excel ---
-def load_real_data(files):
-    dfs = []
-    for f in files:
-        df = pd.read_excel(f, sheet_name="Sheet1", engine="openpyxl")
-        dfs.append(df)
-    df_all = pd.concat(dfs, ignore_index=True)
+def load_real_data(files, workers=None):
+    # workers=1 force la lecture séquentielle ; None = un processus par cœur
+    dfs, digests = _read_sheets(files, workers)
+    _prune_cache()
+    df_all = _storable(pd.concat(dfs, ignore_index=True))
+    for col in DIMENSIONS:
+        if col in df_all.columns:
+            df_all[col] = df_all[col].astype("category")
     df_all["Posting Date"] = pd.to_datetime(df_all["Posting Date"], errors="coerce")
     df_all["Year"] = df_all["Posting Date"].dt.year
     df_all["Month"] = df_all["Posting Date"].dt.month
     df_all["Cost"] = df_all["In profit center local currency"].fillna(0)
+    # Empreinte dérivée des hachages des fichiers sources : O(1) à comparer
+    df_all.attrs["fingerprint"] = hashlib.sha256(
+        "".join(digests + [SCHEMA_KEY]).encode()
+    ).hexdigest()[:16]
     return df_all
 
-# --- Calcul automatique Budget & Forecast ---
-def compute_budget_forecast(df):
-    ts = (
-        df
-        .groupby(df["Posting Date"].dt.to_period("M"))["Cost"]
-        .sum()
-        .sort_index()
-        .to_timestamp()
-    )
-    if len(ts) < 2:
-        return pd.DataFrame(columns=["Period", "Budget", "Year", "Month"]), pd.DataFrame(columns=["Period", "Forecast", "Year", "Month"])
-
-    growth12 = ts.pct_change(12).dropna().mean() if len(ts) >= 13 else 0.05
-    last = ts.iloc[-1]
-    next_period = ts.index[-1] + pd.offsets.MonthBegin()
-    budget_next = last * (1 + growth12)
-    budget = pd.Series(budget_next, index=[next_period])
-
+# --- Domaines des champs (listes d'options triées) ---
+def field_domains(df):
+    # Calculés une fois par version du jeu de données et rangés à côté du cache Parquet
+    path = CACHE_DIR / f"{dataset_fingerprint(df)}-domains.pkl"
+    if path.exists():
+        try:
+            with open(path, "rb") as fh:
+                domains = pickle.load(fh)
+            _touch(path)
+            return domains
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+    domains = {}
+    for col in DOMAIN_FIELDS:
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Jeu complet : catégories = valeurs distinctes, sans parcourir les lignes
+            values = df[col].cat.categories
+        else:
+            values = pd.unique(df[col].dropna())
+        try:
+            domains[col] = sorted(values)
+        except TypeError:
+            domains[col] = sorted(values, key=str)
     try:
-        model = ExponentialSmoothing(ts, trend="add", seasonal=None, initialization_method="estimated")
-        fit = model.fit()
-        forecast = fit.forecast(1)
-    except Exception:
-        forecast = pd.Series([last], index=[next_period])
-
-    dfB = pd.DataFrame({
-        "Period": pd.to_datetime(list(ts.index.to_timestamp()) + list(budget.index.to_timestamp())),
-        "Budget": list(ts.values) + [budget_next]
-    })
-    dfF = pd.DataFrame({
-        "Period": pd.to_datetime(list(ts.index.to_timestamp()) + list(forecast.index.to_timestamp())),
-        "Forecast": list(ts.values) + list(forecast.values)
-    })
-    for dfx in (dfB, dfF):
-        dfx["Year"] = dfx["Period"].dt.year
-        dfx["Month"] = dfx["Period"].dt.month
-    return dfB, dfF
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(domains, fh)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    _prune_cache()
+    return domains
@@ -1,18 +1,8 @@
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
-# --- Chargement des fichiers Excel ---
-def load_real_data(files):
-    dfs = []
-    for f in files:
-        df = pd.read_excel(f, sheet_name="Sheet1", engine="openpyxl")
-        dfs.append(df)
-    df_all = pd.concat(dfs, ignore_index=True)
-    df_all["Posting Date"] = pd.to_datetime(df_all["Posting Date"])
-    df_all["Year"]  = df_all["Posting Date"].dt.year
-    df_all["Month"] = df_all["Posting Date"].dt.month
-    df_all["Cost"]  = df_all["In profit center local currency"].fillna(0)
-    return df_all
+from forecast import series_lineage
+from model_selection import forecast_ets
+from util import load_real_data, dataset_fingerprint, field_domains
 
 # --- Calcul automatique Budget & Forecast ---
 def compute_budget_forecast(df):
@@ -32,12 +22,9 @@ def compute_budget_forecast(df):
     budget_next = last * (1 + growth12)
     budget = pd.Series(budget_next, index=[next_period])
 
-    try:
-        model = ExponentialSmoothing(ts, trend="add", seasonal=None, initialization_method="estimated")
-        fit   = model.fit()
-        forecast = fit.forecast(1)
-    except Exception:
-        forecast = pd.Series([last], index=[next_period])
+    # Variante de lissage choisie automatiquement (tendance, amortissement, saison 12 mois)
+    monthly = ts.to_frame("Total").asfreq("MS", fill_value=0.0)
+    forecast = forecast_ets(monthly, "ets-total-" + series_lineage(monthly), 1)["Total"]
 
     dfB = pd.DataFrame({
         "Period": pd.to_datetime(list(ts.index) + list(budget.index)),